@@ -0,0 +1,121 @@
+import http.server
+import json
+import threading
+from serv_obj import Server
+from load_balancer import UnknownServerError, check_weight
+
+
+class AdminOpts:
+    def __init__(self, enabled=False, ip="127.0.0.1", port=8081):
+        self.enabled = enabled
+        self.ip = ip  # keep it on loopback - the API is unauthenticated
+        self.port = port
+
+
+class AdminServer:
+    """
+    Local HTTP/JSON API for changing the backend fleet of a running load balancer:
+
+        GET    /servers                   list servers with health, weight, draining flag and active connections
+        POST   /servers                   add {"name", "ip", "port", "weight" (optional)}
+        DELETE /servers/<name>            remove - no new connections, open ones finish normally
+        POST   /servers/<name>/drain      stop sending new connections (undo with /undrain)
+        POST   /servers/<name>/undrain
+        PUT    /servers/<name>/weight     set {"weight"}
+        POST   /reload                    re-read the config file, like SIGHUP, and report what changed
+
+    Every change goes through the LoadBalancer methods, which update the strategy incrementally and republish the snapshot.
+    """
+
+    def __init__(self, lb, opts: AdminOpts = AdminOpts(), reloader=None):
+        self.lb = lb
+        self.opts = opts
+        self.reloader = reloader  # config.ConfigReloader
+        self.httpd = http.server.ThreadingHTTPServer((opts.ip, opts.port), self.handler_class())
+        self.httpd.daemon_threads = True
+
+    def start(self):
+        thread = threading.Thread(target=self.httpd.serve_forever, name="admin", daemon=True)
+        thread.start()
+        self.lb.logger.info("Admin API listening on %s:%s", self.opts.ip, self.opts.port)
+
+    def respond(self, method: str, path: str, body: dict):
+        """ handle, with errors turned into error responses. Every request gets one, whatever went wrong. """
+        try:
+            return self.handle(method, path, body)
+        except UnknownServerError as e:
+            return 404, {"error": str(e)}
+        except KeyError as e:
+            return 400, {"error": f"Missing field {e}"}
+        except (ValueError, TypeError) as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    def handle(self, method: str, path: str, body: dict):
+        """ Route one request. Returns (status, response object). """
+        parts = [part for part in path.split("/") if part]
+        if parts == ["reload"] and self.reloader is not None:
+            if method != "POST":
+                return 405, {"error": f"{method} not supported on {path}"}
+            return 200, self.reloader.reload()
+        if not parts or parts[0] != "servers" or len(parts) > 3:
+            return 404, {"error": f"Unknown path {path}"}
+
+        if len(parts) == 1:
+            if method == "GET":
+                return 200, self.lb.server_stats()
+            if method == "POST":
+                server = Server(body["name"], body["ip"], int(body["port"]))
+                if "weight" in body:
+                    server.set_additional_info("weight", parse_weight(body["weight"]))
+                self.lb.add_server(server)
+                return 201, {"added": server.name}
+        elif len(parts) == 2 and method == "DELETE":
+            self.lb.remove_server(parts[1])
+            return 200, {"removed": parts[1]}
+        elif len(parts) == 3:
+            name, action = parts[1], parts[2]
+            if action in ("drain", "undrain") and method == "POST":
+                self.lb.drain_server(name, action == "drain")
+                return 200, {action: name}
+            if action == "weight" and method in ("PUT", "POST"):
+                self.lb.set_server_weight(name, parse_weight(body["weight"]))
+                return 200, {"weight": name}
+        return 405, {"error": f"{method} not supported on {path}"}
+
+    def handler_class(self):
+        admin = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_request(self):
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    body = json.loads(self.rfile.read(length)) if length else {}
+                except ValueError as e:
+                    body = None
+                    status, response = 400, {"error": f"Invalid JSON body: {e}"}
+                if body is not None:
+                    status, response = admin.respond(self.command, self.path, body)
+                payload = (json.dumps(response, indent=2) + "\n").encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_request
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def parse_weight(weight) -> int:
+    """
+    Weights divide the load in the least connections / response time and P2C strategies, so 0 is not allowed. Only JSON
+    integers are accepted - 2.7 or "2" is rejected rather than truncated, the same for the admin API and config files.
+    """
+    check_weight(weight)
+    return weight
@@ -0,0 +1,203 @@
+import asyncio
+import resource
+import time
+from load_balancer import LoadBalancer, BUF_SIZE, TIMEOUT, INTERNAL_SERVER_ERROR_RESPONSE
+from http_helper import HTTPResponse
+from http_parser import HeaderParser, HeaderParseError
+from response_time import ExchangeTimer
+
+
+class AsyncLoadBalancer(LoadBalancer):
+    """
+    Load balancer data plane that accepts, selects, connects and forwards every client connection on a single asyncio event loop
+    instead of spawning a thread per connection. Shedding, sticky sessions, strategy selection and health checks are shared with LoadBalancer.
+    Only the l4 proxy mode with copy forwarding is supported; config validation rejects l7 and splice for this data plane.
+    """
+
+    def make_hedge_executor(self):
+        return None  # hedged connects run as tasks on the event loop
+
+    def start_lb(self):
+        self.raise_fd_limit()
+        asyncio.run(self.serve())
+
+    def raise_fd_limit(self):
+        """ Each proxied connection holds two sockets, so lift the soft open file limit up to the hard limit. """
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != hard:
+            try:
+                resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            except (ValueError, OSError) as e:
+                self.print_debug("Could not raise open file limit above %s: %s", soft, e)
+
+    async def serve(self):
+        self.lb_socket.setblocking(False)
+        server = await asyncio.start_server(self.handle_client, sock=self.lb_socket, limit=BUF_SIZE)
+        self.print_debug("Load Balancer (asyncio) started, waiting for connections...")
+        async with server:
+            await server.serve_forever()
+
+    async def handle_client(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter):
+        """ Coroutine equivalent of accept_connection + handle_connection for one client. """
+
+        client_addr = client_writer.get_extra_info("peername")
+        request = None
+
+        if self.needs_request():
+            # Read the request head and replay it to the server once connected
+            try:
+                request = await asyncio.wait_for(self.read_request_head_async(client_reader), TIMEOUT)
+            except Exception as e:
+                self.print_debug(
+                    "Error receiving initial data from client %s, closing connection: %s", client_addr, e)
+                await self.close_writer(client_writer)
+                return
+
+        server, error_response = self.select_server(client_addr, request)
+        if server is None:
+            await self.send_error(client_writer, error_response[0], error_response[1])
+            await self.close_writer(client_writer)
+            return
+
+        server, server_reader, server_writer = await self.connect_server_async(server, client_addr, request)
+        if server is None:
+            self.print_debug(
+                "Failed to connect to any server for %s, closing client connection", client_addr)
+            await self.send_error(client_writer, INTERNAL_SERVER_ERROR_RESPONSE[0], INTERNAL_SERVER_ERROR_RESPONSE[1])
+            await self.close_writer(client_writer)
+            return
+        self.print_debug(
+            "Accepted connection from %s, forwarding to server %s", client_addr, server.name)
+
+        is_error = False
+        timer = ExchangeTimer(lambda ttfb, total: self.record_response_time(server, ttfb, total))
+        try:
+            if request is not None and request.buf:
+                server_writer.write(request.buf)
+                await server_writer.drain()
+                timer.client_sent()
+
+            # Same teardown semantics as the threaded plane: the first side to close ends the whole connection
+            pipes = [
+                asyncio.ensure_future(self.pipe(client_reader, server_writer, "client", timer.client_sent)),
+                asyncio.ensure_future(self.pipe(server_reader, client_writer, "server", timer.server_sent)),
+            ]
+            done, pending = await asyncio.wait(pipes, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            for task in done:
+                task.result()
+            timer.finish()
+        except Exception as e:
+            self.print_debug(
+                "Exception during forwarding: %s. Closing connection.", e)
+            await self.send_error(client_writer, INTERNAL_SERVER_ERROR_RESPONSE[0], INTERNAL_SERVER_ERROR_RESPONSE[1])
+            is_error = True
+        finally:
+            await self.close_writer(server_writer)
+            await self.close_writer(client_writer)
+            self.release_server(server, is_error=is_error, latency=timer.mean_ttfb())
+
+    async def connect_server_async(self, server, client_addr, request: HeaderParser = None):
+        """ Coroutine equivalent of connect_server. Returns (server, reader, writer), or Nones once every attempt failed. """
+        exclude = set()
+        attempts = self.opts.retry_opts.max_attempts
+        while True:
+            connected, server_reader, server_writer = await self.try_connect_async(server, client_addr, request, exclude)
+            if connected is not None:
+                return connected, server_reader, server_writer
+
+            attempts -= 1
+            if attempts <= 0 or not self.retry_budget.try_withdraw():
+                return None, None, None
+            server, _ = self.select_server(client_addr, request, exclude)
+            if server is None:
+                return None, None, None
+            self.print_debug("Retrying %s on server %s", client_addr, server.name)
+
+    async def open_backend(self, server):
+        start = time.time()
+        server_reader, server_writer = await asyncio.wait_for(
+            asyncio.open_connection(server.ip, server.port, limit=BUF_SIZE), self.opts.retry_opts.connect_timeout)
+        self.record_connect_latency(server, time.time() - start)
+        self.report_backend_result(server)
+        return server_reader, server_writer
+
+    async def try_connect_async(self, server, client_addr, request: HeaderParser, exclude: set):
+        """
+        One connect attempt, hedged like LoadBalancer.hedged_connect when enabled. An unfinished losing connect is cancelled.
+        Returns (server, reader, writer), or Nones with every failed server released and added to exclude.
+        """
+        opts = self.opts.hedge_opts
+        attempts = {asyncio.ensure_future(self.open_backend(server)): server}
+        if opts.enabled:
+            done, _ = await asyncio.wait(attempts, timeout=self.connect_latency.delay(opts.min_delay, opts.max_delay))
+            if not done and self.hedge_budget.try_withdraw():
+                hedge_server, _ = self.select_server(client_addr, request, exclude | {server})
+                if hedge_server is not None:
+                    self.print_debug("Hedging connect for %s to server %s", client_addr, hedge_server.name)
+                    attempts[asyncio.ensure_future(self.open_backend(hedge_server))] = hedge_server
+
+        winner = None
+        pending = set(attempts)
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    self.connect_failed(attempts[task], task.exception())
+                    exclude.add(attempts[task])
+                elif winner is None:
+                    winner = task
+                else:
+                    await self.close_writer(task.result()[1])
+                    self.release_server(attempts[task])
+        for task in pending:
+            task.cancel()
+            # Cancelled before a verdict: give back a half-open trial slot it may hold. Losers are slow by construction,
+            # so their times are kept out of the latency stats.
+            attempts[task].circuit_breaker.release_trial()
+            self.release_server(attempts[task])
+
+        if winner is None:
+            return None, None, None
+        if attempts[winner] is not server:
+            self.hedge_wins.add(1)
+        return (attempts[winner], *winner.result())
+
+    async def read_request_head_async(self, reader: asyncio.StreamReader) -> HeaderParser:
+        parser = HeaderParser()
+        try:
+            while True:
+                data = await reader.read(BUF_SIZE)
+                if not data or parser.feed(data):
+                    return parser
+        except HeaderParseError:
+            return parser
+
+    async def pipe(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, source: str, on_data=None):
+        """ Forward data from reader to writer until EOF, waiting on drain so a slow peer applies backpressure. on_data runs after every chunk. """
+        while True:
+            data = await reader.read(BUF_SIZE)
+            self.print_debug("Received %s bytes from %s", len(data), source)
+            if not data:
+                self.print_debug("No data received, closing connection")
+                return
+            writer.write(data)
+            await writer.drain()
+            if on_data is not None:
+                on_data()
+
+    async def send_error(self, writer: asyncio.StreamWriter, status_code: int, msg: str):
+        """ Attempt to send an HTTP error response to the client. """
+        try:
+            writer.write(HTTPResponse(status_code, msg).get_response_string().encode())
+            await writer.drain()
+        except Exception as e:
+            self.print_debug("Error sending %s response: %s", status_code, e)
+
+    async def close_writer(self, writer: asyncio.StreamWriter):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except Exception:
+            pass
@@ -0,0 +1,163 @@
+import threading
+import time
+import typing
+from lb_logger import INFO, WARNING
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreakerOpts:
+    def __init__(self, enabled=True, failure_threshold=5, open_time=5, half_open_trials=1, success_threshold=1):
+        self.enabled = enabled
+        self.failure_threshold = failure_threshold  # consecutive connect failures / timeouts that open the breaker
+        self.open_time = open_time  # seconds an open breaker rejects everything before letting trials through
+        self.half_open_trials = half_open_trials  # trial requests in flight at once while half-open
+        self.success_threshold = success_threshold  # successful trials that close the breaker again
+
+
+class CircuitBreaker:
+    """
+    Per-server circuit breaker. Closed passes everything; failure_threshold consecutive connect failures or timeouts open it,
+    and an open breaker fails fast for open_time. It then turns half-open and lets half_open_trials requests through at a
+    time - success_threshold successes close it, any failure opens it again. An attempt that ends without either verdict
+    (e.g. a full pool or a cancelled hedge) gives its trial slot back through release_trial, and as a backstop slots that
+    stay taken for open_time are freed by the next claim, so a lost verdict cannot keep the server out of rotation for good.
+    on_change is called on every state change (closed <-> open, open -> half-open, half-open -> closed), so the server can
+    be dropped from (or returned to) the snapshot the strategies pick from. Trial slots filling up and freeing do not
+    change the snapshot; strategies check selectable() on the server they pick instead.
+    """
+
+    def __init__(self, name: str, opts: CircuitBreakerOpts = CircuitBreakerOpts(), on_change: typing.Callable[[], None] = None,
+                 logger=None):
+        self.name = name
+        self.opts = opts
+        self.on_change = on_change
+        self.logger = logger  # AsyncLogger for state changes, written after the lock is released
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0  # consecutive, while closed
+        self.trials = 0  # in flight, while half-open
+        self.trial_successes = 0
+        self.trials_deadline = 0  # monotonic time after which trial slots that are all taken count as lost
+
+        self.opened = 0
+        self.rejected = 0
+        self.trial_count = 0
+        self.state_changed = time.time()
+
+    def selectable(self) -> bool:
+        """ Whether the breaker would let a request through right now. Read without the lock, on every strategy lookup. """
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and (self.trials < self.opts.half_open_trials
+                                                           or time.monotonic() >= self.trials_deadline))
+
+    def allow_request(self) -> bool:
+        """ Claim a slot for a request: always when closed, a trial slot when half-open, never when open. """
+        if not self.opts.enabled:
+            return True
+        expired = False
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state != HALF_OPEN:
+                self.rejected += 1
+                return False
+            now = time.monotonic()
+            if self.trials >= self.opts.half_open_trials:
+                if now < self.trials_deadline:
+                    self.rejected += 1
+                    return False
+                # Every slot stayed taken for open_time without a verdict: count them as lost
+                self.trials = 0
+                expired = True
+            self.trials += 1
+            self.trial_count += 1
+            if self.trials == self.opts.half_open_trials:
+                self.trials_deadline = now + self.opts.open_time
+        if expired and self.logger is not None:
+            self.logger.warning("Circuit breaker for %s: half-open trials got no verdict within %ss, freed", self.name, self.opts.open_time)
+        return True
+
+    def release_trial(self):
+        """ Give back a half-open trial slot claimed by an attempt that ended without a success or failure verdict. """
+        if not self.opts.enabled:
+            return
+        with self.lock:
+            if self.state == HALF_OPEN and self.trials > 0:
+                self.trials -= 1
+
+    def record_success(self):
+        if not self.opts.enabled:
+            return
+        with self.lock:
+            if self.state == CLOSED:
+                self.failures = 0
+                return
+            if self.state != HALF_OPEN:
+                return
+            self.trials = max(0, self.trials - 1)
+            self.trial_successes += 1
+            closed = self.trial_successes >= self.opts.success_threshold
+            if closed:
+                self._transition(CLOSED)
+        if closed:
+            self._log_transition(HALF_OPEN, CLOSED)
+            self._changed()
+
+    def record_failure(self):
+        if not self.opts.enabled:
+            return
+        with self.lock:
+            if self.state == CLOSED:
+                self.failures += 1
+                if self.failures < self.opts.failure_threshold:
+                    return
+            elif self.state != HALF_OPEN:
+                return
+            previous = self._transition(OPEN)
+        self._log_transition(previous, OPEN)
+        self._changed()
+
+        timer = threading.Timer(self.opts.open_time, self._half_open)
+        timer.daemon = True
+        timer.start()
+
+    def _half_open(self):
+        with self.lock:
+            if self.state != OPEN:
+                return
+            self._transition(HALF_OPEN)
+        self._log_transition(OPEN, HALF_OPEN)
+        self._changed()
+
+    def _transition(self, state: str) -> str:
+        """ Switch to state and return the previous one. Caller holds the lock and logs the change after releasing it. """
+        previous = self.state
+        self.state = state
+        self.state_changed = time.time()
+        self.failures = 0
+        self.trials = 0
+        self.trial_successes = 0
+        if state == OPEN:
+            self.opened += 1
+        return previous
+
+    def _log_transition(self, previous: str, state: str):
+        if self.logger is not None:
+            self.logger.log(WARNING if state == OPEN else INFO, "Circuit breaker for %s: %s -> %s", self.name, previous, state)
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "state": self.state,
+                "seconds_in_state": round(time.time() - self.state_changed, 1),
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "trials": self.trial_count,
+            }
@@ -0,0 +1,303 @@
+import json
+import threading
+import time
+import typing
+from strategies.lb_strategy import LBStrategy
+from strategies.round_robin_strategy import RoundRobinStrategy
+from strategies.consistent_hash_strategy import ConsistentHashing
+from strategies.bounded_load_hash_strategy import BoundedLoadHashing
+from strategies.rendezvous_hash_strategy import RendezvousHashing
+from strategies.maglev_strategy import MaglevHashing, MAGLEV_TABLE_SIZE
+from strategies.weighted_round_robin_strategy import WeightedRoundRobinStrategy
+from strategies.least_connections_strategy import LeastConnectionsStrategy
+from strategies.indexed_least_connections_strategy import IndexedLeastConnectionsStrategy
+from strategies.least_response_time_strategy import LeastResponseTimeStrategy
+from strategies.power_of_two_choices_strategy import PowerOfTwoChoicesStrategy
+from load_balancer import LBOpts, STICKY_TIMEOUT, STICKY_MAX_SESSIONS, LISTEN_BACKLOG
+from lb_logger import LogOpts, LEVELS
+from outlier_detection import OutlierOpts
+from circuit_breaker import CircuitBreakerOpts
+from retry import RetryOpts
+from hedging import HedgeOpts
+from load_shedder import LoadShedParams
+from connection_pool import PoolOpts
+from admin import AdminOpts, parse_weight
+from serv_obj import Server
+
+STRATEGIES = ("round_robin", "hash", "bounded_hash", "rendezvous", "maglev", "weighted_round_robin", "least_connections",
+              "least_connections_indexed", "least_response_time", "power_of_two_choices")
+
+FORWARDING_MODES = ("copy", "splice")
+HASH_KEYS = ("source_ip", "sid", "host", "path", "cookie")  # or "cookie:<name>"
+
+# Keys a reload cannot apply: they configure sockets, worker processes or per-server state built once at startup
+RESTART_KEYS = ("load_balancer_ip", "load_balancer_port", "data_plane", "workers", "cpu_affinity", "proxy_mode",
+                "listen_backlog", "sticky_sessions", "sticky_timeout", "sticky_max_sessions", "health_check_concurrency",
+                "connection_pool", "circuit_breaker", "outlier_detection", "retry", "hedging", "logging", "admin")
+
+
+class ConfigError(ValueError):
+    """ Raised for a config file that cannot be read or does not validate. """
+
+
+def get_strategy(strategy_name: str, servers: typing.List[Server], *, replica_count=100, hash_key="source_ip", table_size=MAGLEV_TABLE_SIZE,
+                 balance_factor=0.25) -> LBStrategy:
+    if strategy_name == "round_robin":
+        return RoundRobinStrategy(servers)
+    elif strategy_name == "hash":
+        return ConsistentHashing(servers, replica_count, hash_key)
+    elif strategy_name == "bounded_hash":
+        return BoundedLoadHashing(servers, replica_count, hash_key, balance_factor)
+    elif strategy_name == "rendezvous":
+        return RendezvousHashing(servers, hash_key)
+    elif strategy_name == "maglev":
+        return MaglevHashing(servers, table_size, hash_key)
+    elif strategy_name == "weighted_round_robin":
+        return WeightedRoundRobinStrategy(servers)
+    elif strategy_name == "least_connections":
+        return LeastConnectionsStrategy(servers)
+    elif strategy_name == "least_connections_indexed":
+        return IndexedLeastConnectionsStrategy(servers)
+    elif strategy_name == "least_response_time":
+        return LeastResponseTimeStrategy(servers)
+    elif strategy_name == "power_of_two_choices":
+        return PowerOfTwoChoicesStrategy(servers)
+    else:
+        return None
+
+
+
+def parse_lb_opts(config: dict) -> LBOpts:
+    return LBOpts(
+        sticky_sessions=config.get("sticky_sessions", False),
+        debug_mode=config.get("debug_mode", False),
+        health_check_interval=config.get("health_check_interval", 3),
+        health_check_path=config.get("health_check_path", "/health"),
+        health_check_timeout=config.get("health_check_timeout", 2),
+        health_check_rise=config.get("health_check_rise", 1),
+        health_check_fall=config.get("health_check_fall", 1),
+        health_check_max_backoff=config.get("health_check_max_backoff", 0),
+        health_check_concurrency=config.get("health_check_concurrency", 256),
+        breaker_opts=CircuitBreakerOpts(
+            enabled=config.get("circuit_breaker", {}).get("enabled", True),
+            failure_threshold=config.get("circuit_breaker", {}).get("failure_threshold", 5),
+            open_time=config.get("circuit_breaker", {}).get("open_time", 5),
+            half_open_trials=config.get("circuit_breaker", {}).get("half_open_trials", 1),
+            success_threshold=config.get("circuit_breaker", {}).get("success_threshold", 1)
+        ),
+        retry_opts=RetryOpts(
+            max_attempts=config.get("retry", {}).get("max_attempts", 3),
+            connect_timeout=config.get("retry", {}).get("connect_timeout", 1.0),
+            budget=config.get("retry", {}).get("budget", 0.2),
+            min_retries=config.get("retry", {}).get("min_retries", 10)
+        ),
+        hedge_opts=HedgeOpts(
+            enabled=config.get("hedging", {}).get("enabled", False),
+            percentile=config.get("hedging", {}).get("percentile", 95),
+            min_delay=config.get("hedging", {}).get("min_delay", 0.005),
+            max_delay=config.get("hedging", {}).get("max_delay", 1.0),
+            budget=config.get("hedging", {}).get("budget", 0.05),
+            min_hedges=config.get("hedging", {}).get("min_hedges", 5)
+        ),
+        outlier_opts=OutlierOpts(
+            enabled=config.get("outlier_detection", {}).get("enabled", True),
+            consecutive_failures=config.get("outlier_detection", {}).get("consecutive_failures", 3),
+            window=config.get("outlier_detection", {}).get("window", 10),
+            error_rate=config.get("outlier_detection", {}).get("error_rate", 0.5),
+            min_requests=config.get("outlier_detection", {}).get("min_requests", 10),
+            latency_factor=config.get("outlier_detection", {}).get("latency_factor", 3.0),
+            base_ejection_time=config.get("outlier_detection", {}).get("base_ejection_time", 5),
+            max_ejection_time=config.get("outlier_detection", {}).get("max_ejection_time", 60),
+            max_ejection_percent=config.get("outlier_detection", {}).get("max_ejection_percent", 50)
+        ),
+        load_shedding_enabled=config.get("load_shedding_enabled", False),
+        load_shed_params=LoadShedParams(
+            sim_conn_threshold=config.get("load_shed_params", {}).get("sim_conn_threshold", 5),
+            strategy=config.get("load_shed_params", {}).get("strategy", "exponential")
+        ),
+        data_plane=config.get("data_plane", "threaded"),
+        workers=config.get("workers", 1),
+        cpu_affinity=config.get("cpu_affinity", False),
+        forwarding_mode=config.get("forwarding_mode", "copy"),
+        pool_opts=PoolOpts(
+            max_idle=config.get("connection_pool", {}).get("max_idle", 8),
+            max_per_backend=config.get("connection_pool", {}).get("max_per_backend", 0),
+            idle_ttl=config.get("connection_pool", {}).get("idle_ttl", 30)
+        ),
+        proxy_mode=config.get("proxy_mode", "l4"),
+        sticky_timeout=config.get("sticky_timeout", STICKY_TIMEOUT),
+        sticky_max_sessions=config.get("sticky_max_sessions", STICKY_MAX_SESSIONS),
+        listen_backlog=config.get("listen_backlog", LISTEN_BACKLOG),
+        log_opts=LogOpts(
+            path=config.get("logging", {}).get("file", "lb.log"),
+            level=parse_level(config.get("logging", {}).get("level", "warning")),
+            capacity=config.get("logging", {}).get("buffer_size", 65536),
+            max_bytes=config.get("logging", {}).get("max_bytes", 10 * 1024 * 1024),
+            backup_count=config.get("logging", {}).get("backup_count", 3),
+            echo=config.get("logging", {}).get("stdout", True)
+        )
+    )
+
+
+def parse_level(name: str) -> int:
+    if name not in LEVELS:
+        raise ConfigError(f"Unknown logging level: {name} (expected one of {', '.join(LEVELS)})")
+    return LEVELS[name]
+
+
+def is_positive_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 1
+
+
+def parse_server(spec: dict) -> Server:
+    server = Server(spec["name"], spec["ip"], int(spec["port"]))
+    # Set weight if specified in config
+    if "weight" in spec:
+        try:
+            server.set_additional_info("weight", parse_weight(spec["weight"]))
+        except ValueError as e:
+            raise ValueError(f"server {spec['name']}: {e}") from None
+    return server
+
+
+def is_prime(n: int) -> bool:
+    return n > 1 and all(n % d for d in range(2, int(n ** 0.5) + 1))
+
+
+class LBConfig:
+    """
+    One parsed and validated config file. Never modified after it is built - a reload parses a new one, so a bad file
+    is rejected before anything in the running load balancer changes.
+    """
+
+    def __init__(self, config: dict):
+        try:
+            self.config = config
+            self.ip = config["load_balancer_ip"]
+            self.port = int(config["load_balancer_port"])
+            self.server_specs = tuple(config["servers"])
+            self.strategy_name = config.get("strategy", "round_robin")
+            self.strategy_options = {
+                "hash_key": config.get("hash_key", "source_ip"),
+                "table_size": config.get("maglev_table_size", MAGLEV_TABLE_SIZE),
+                "balance_factor": config.get("hash_balance_factor", 0.25),
+            }
+            self.lb_opts = parse_lb_opts(config)
+            self.admin_opts = AdminOpts(
+                enabled=config.get("admin", {}).get("enabled", False),
+                ip=config.get("admin", {}).get("ip", "127.0.0.1"),
+                port=config.get("admin", {}).get("port", 8081)
+            )
+            self.validate()
+        except ConfigError:
+            raise
+        except KeyError as e:
+            raise ConfigError(f"Missing config key {e}") from None
+        except (TypeError, ValueError, AttributeError) as e:
+            raise ConfigError(f"Invalid config: {e}") from None
+
+    def validate(self):
+        opts = self.lb_opts
+        names = [spec["name"] for spec in self.server_specs]
+        if len(set(names)) != len(names):
+            raise ConfigError("Server names must be unique")
+        self.build_servers()  # checks every server entry
+        if self.strategy_name not in STRATEGIES:
+            raise ConfigError(f"Unknown strategy: {self.strategy_name}")
+        if self.strategy_name == "maglev" and not is_prime(self.strategy_options["table_size"]):
+            raise ConfigError("maglev_table_size must be a prime")
+        hash_key = self.strategy_options["hash_key"]
+        if hash_key not in HASH_KEYS and not (isinstance(hash_key, str) and hash_key.startswith("cookie:") and hash_key != "cookie:"):
+            raise ConfigError(f"Unknown hash_key: {hash_key} (expected one of {', '.join(HASH_KEYS)} or cookie:<name>)")
+        if opts.data_plane not in ("threaded", "asyncio"):
+            raise ConfigError(f"Unknown data plane: {opts.data_plane}")
+        if opts.proxy_mode not in ("l4", "l7"):
+            raise ConfigError(f"Unknown proxy mode: {opts.proxy_mode}")
+        if opts.forwarding_mode not in FORWARDING_MODES:
+            raise ConfigError(f"Unknown forwarding mode: {opts.forwarding_mode}")
+        if opts.data_plane == "asyncio" and opts.proxy_mode == "l7":
+            raise ConfigError("The l7 proxy mode is only supported by the threaded data plane")
+        if opts.data_plane == "asyncio" and opts.forwarding_mode == "splice":
+            raise ConfigError("The splice forwarding mode is only supported by the threaded data plane")
+        if not is_positive_int(opts.workers):
+            raise ConfigError(f"workers must be an integer >= 1, got {opts.workers!r}")
+        if not is_positive_int(opts.listen_backlog):
+            raise ConfigError(f"listen_backlog must be an integer >= 1, got {opts.listen_backlog!r}")
+        if self.admin_opts.enabled and opts.workers > 1:
+            raise ConfigError("The admin API is only supported with a single worker")
+        if opts.health_check_interval <= 0 or opts.health_check_timeout <= 0:
+            raise ConfigError("health_check_interval and health_check_timeout must be > 0")
+
+    def build_servers(self) -> typing.List[Server]:
+        return [parse_server(spec) for spec in self.server_specs]
+
+    def strategy_factory(self) -> typing.Callable[[typing.List[Server]], LBStrategy]:
+        return lambda servers: get_strategy(self.strategy_name, servers, **self.strategy_options)
+
+    def restart_changes(self, running: "LBConfig") -> typing.List[str]:
+        """ RESTART_KEYS whose value differs from the running config. """
+        return [key for key in RESTART_KEYS if self.config.get(key) != running.config.get(key)]
+
+    def with_restart_keys_from(self, running: "LBConfig") -> "LBConfig":
+        """ This config with the RESTART_KEYS of the running one, i.e. what a reload can actually apply. """
+        config = {key: value for key, value in self.config.items() if key not in RESTART_KEYS}
+        config.update((key, running.config[key]) for key in RESTART_KEYS if key in running.config)
+        return LBConfig(config)
+
+
+def load_config(path: str) -> LBConfig:
+    try:
+        with open(path, 'r') as f:
+            config = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ConfigError(f"Cannot read config {path}: {e}") from None
+    return LBConfig(config)
+
+
+class ConfigReloader:
+    """
+    Re-reads the config file on SIGHUP (or POST /reload on the admin API) and applies it to the running load balancer.
+    The file is parsed and validated first - a bad one leaves everything as it was. The fleet is diffed by server name, a
+    changed strategy is rebuilt and swapped in whole, and open connections and sticky sessions carry over.
+    """
+
+    def __init__(self, lb, path: str, config: LBConfig):
+        self.lb = lb
+        self.path = path
+        self.config = config
+        self.lock = threading.Lock()  # one reload at a time
+
+    def reload(self) -> dict:
+        with self.lock:
+            start = time.perf_counter()
+            config = load_config(self.path)
+            restart_required = config.restart_changes(self.config)
+            config = config.with_restart_keys_from(self.config)
+            strategy_changed = (config.strategy_name, config.strategy_options) != (self.config.strategy_name, self.config.strategy_options)
+            swap_start = time.perf_counter()
+            changes = self.lb.apply_config(config.build_servers(), config.lb_opts,
+                                           config.strategy_factory() if strategy_changed else None)
+            end = time.perf_counter()
+            self.config = config
+
+        report = {
+            "changes": changes,
+            "restart_required": restart_required,
+            "reload_ms": round((end - start) * 1000, 3),
+            "swap_ms": round((end - swap_start) * 1000, 3),
+        }
+        self.lb.logger.info("Reloaded %s in %.2fms (swap %.2fms): %s", self.path, report['reload_ms'], report['swap_ms'],
+                            ', '.join(changes) or 'no changes')
+        if restart_required:
+            self.lb.logger.warning("Changes to %s need a restart and were not applied", ', '.join(restart_required))
+        return report
+
+    def on_signal(self, signum=None, frame=None):
+        """ SIGHUP handler. Reloads on its own thread so the accept loop keeps going. """
+        threading.Thread(target=self.reload_or_report, name="reload", daemon=True).start()
+
+    def reload_or_report(self):
+        try:
+            self.reload()
+        except ConfigError as e:
+            self.lb.logger.error("Reload failed, keeping the running config: %s", e)
@@ -0,0 +1,134 @@
+import collections
+import select
+import socket
+import threading
+import time
+from serv_obj import Server
+
+
+class PoolExhaustedError(Exception):
+    """ Raised when a backend already has max_per_backend connections open and none is returned in time. """
+
+
+class PoolOpts:
+    def __init__(self, max_idle=8, max_per_backend=0, idle_ttl=30, connect_timeout=5):
+        self.max_idle = max_idle  # idle keep-alive connections kept per backend
+        self.max_per_backend = max_per_backend  # idle + in use connections per backend, 0 for no limit
+        self.idle_ttl = idle_ttl  # seconds an idle connection may sit in the pool
+        self.connect_timeout = connect_timeout
+
+
+class ConnectionPool:
+    """ Pool of idle keep-alive connections to a single backend server, with hit/miss metrics for sizing. """
+
+    def __init__(self, server: Server, opts: PoolOpts = PoolOpts()):
+        self.server = server
+        self.opts = opts
+        self.idle = collections.deque()  # (sock, time returned), most recently returned on the right
+        self.in_use = 0
+        self.cond = threading.Condition()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.exhausted = 0
+
+    def acquire(self, connect_timeout=None) -> socket.socket:
+        """ Return an idle connection to the server if a live one is pooled, else open a new one (within connect_timeout if given, else the pool's). """
+        connect_timeout = connect_timeout if connect_timeout is not None else self.opts.connect_timeout
+        with self.cond:
+            if not self.server.is_healthy():
+                self._evict_idle()
+            self._evict_expired()
+
+            # Reuse the most recently returned connection, it is the least likely to have been closed by the server
+            while self.idle:
+                sock, _ = self.idle.pop()
+                if self._is_alive(sock):
+                    self.in_use += 1
+                    self.hits += 1
+                    return sock
+                self._close(sock)
+                self.evictions += 1
+
+            if self.opts.max_per_backend:
+                deadline = time.time() + connect_timeout
+                while self.in_use >= self.opts.max_per_backend:
+                    remaining = deadline - time.time()
+                    if remaining <= 0 or not self.cond.wait(remaining):
+                        self.exhausted += 1
+                        raise PoolExhaustedError(
+                            f"{self.server.name} already has {self.in_use} open connections")
+
+            self.in_use += 1
+            self.misses += 1
+
+        # Connect outside the lock so a slow handshake does not block other callers
+        try:
+            sock = socket.create_connection((self.server.ip, self.server.port), timeout=connect_timeout)
+            # Only the handshake is bounded by connect_timeout, reads and writes keep the default timeout
+            sock.settimeout(socket.getdefaulttimeout())
+            return sock
+        except Exception:
+            with self.cond:
+                self.in_use -= 1
+                self.cond.notify()
+            raise
+
+    def release(self, sock: socket.socket, reusable=True):
+        """ Hand a connection back. Only connections left at a clean message boundary should be marked reusable. """
+        with self.cond:
+            self.in_use -= 1
+            if reusable and self.server.is_healthy() and len(self.idle) < self.opts.max_idle:
+                self.idle.append((sock, time.time()))
+            else:
+                self._close(sock)
+            self.cond.notify()
+
+    def discard(self, sock: socket.socket):
+        self.release(sock, reusable=False)
+
+    def evict_idle(self):
+        """ Close every idle connection, e.g. when the server is marked unhealthy. """
+        with self.cond:
+            self._evict_idle()
+
+    def stats(self) -> dict:
+        with self.cond:
+            lookups = self.hits + self.misses
+            return {
+                "idle": len(self.idle),
+                "in_use": self.in_use,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "exhausted": self.exhausted,
+            }
+
+    def _evict_idle(self):
+        while self.idle:
+            sock, _ = self.idle.popleft()
+            self._close(sock)
+            self.evictions += 1
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.opts.idle_ttl
+        while self.idle and self.idle[0][1] < cutoff:
+            sock, _ = self.idle.popleft()
+            self._close(sock)
+            self.evictions += 1
+
+    def _is_alive(self, sock: socket.socket) -> bool:
+        # An idle keep-alive connection should have nothing to read - readable means EOF or stray data, either way unusable
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            return not readable
+        except (OSError, ValueError):
+            return False
+
+    def _close(self, sock: socket.socket):
+        try:
+            sock.close()
+        except OSError:
+            pass
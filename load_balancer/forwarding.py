@@ -0,0 +1,69 @@
+import fcntl
+import os
+import select
+import socket
+
+# splice(2) is Linux only and exposed by Python 3.10+
+SPLICE_AVAILABLE = hasattr(os, "splice")
+PIPE_SIZE = 1 << 16
+
+
+class Forwarder:
+    """
+    Moves data from one socket to another for a single proxied connection.
+    In "splice" mode bytes go socket -> kernel pipe -> socket with splice(2) and never enter Python memory.
+    Otherwise (or when splice is unavailable) they are received into one reusable buffer instead of a fresh bytes object per chunk.
+    """
+
+    def __init__(self, mode="copy", buf_size=4096, timeout=5):
+        self.timeout = timeout
+        self.pipe = None
+
+        if mode == "splice" and SPLICE_AVAILABLE:
+            self.pipe = os.pipe()
+            self.chunk_size = PIPE_SIZE
+            try:
+                fcntl.fcntl(self.pipe[1], fcntl.F_SETPIPE_SZ, PIPE_SIZE)
+            except (AttributeError, OSError):
+                self.chunk_size = buf_size
+        else:
+            self.buffer = memoryview(bytearray(buf_size))
+
+    def is_zero_copy(self) -> bool:
+        return self.pipe is not None
+
+    def forward(self, src: socket.socket, dst: socket.socket):
+        """ Forward one chunk of whatever src has ready to dst. Returns the number of bytes moved, 0 on EOF, or None if src had nothing to read after all. """
+        try:
+            if self.pipe is not None:
+                return self._splice(src, dst)
+            return self._copy(src, dst)
+        except BlockingIOError:
+            return None
+
+    def _copy(self, src: socket.socket, dst: socket.socket) -> int:
+        received = src.recv_into(self.buffer)
+        if received:
+            dst.sendall(self.buffer[:received])
+        return received
+
+    def _splice(self, src: socket.socket, dst: socket.socket) -> int:
+        pipe_read, pipe_write = self.pipe
+        received = os.splice(src.fileno(), pipe_write, self.chunk_size, flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+
+        # Always drain the pipe completely so it is empty for the next chunk in either direction
+        remaining = received
+        while remaining:
+            try:
+                remaining -= os.splice(pipe_read, dst.fileno(), remaining, flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+            except BlockingIOError:
+                _, writable, _ = select.select([], [dst], [], self.timeout)
+                if not writable:
+                    raise TimeoutError("timed out writing to destination socket")
+        return received
+
+    def close(self):
+        if self.pipe is not None:
+            os.close(self.pipe[0])
+            os.close(self.pipe[1])
+            self.pipe = None
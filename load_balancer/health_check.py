@@ -1,17 +1,30 @@
+import asyncio
+import random
+import socket
 import threading
 import typing
 import time
-import socket
 from serv_obj import Server
 
-HTTP_PORT = 80
+JITTER = 0.1  # each check period is randomly stretched or shrunk by up to this fraction
 
 class HealthCheckInfo:
     WEIGHT = 0.8  # weight for moving average
 
     def __init__ (self):
         self.avg_rtt = 0.0
-        
+
+        # Consecutive probe results, for the rise/fall thresholds and backoff
+        self.successes = 0
+        self.failures = 0
+
+    def record(self, ok: bool):
+        if ok:
+            self.successes += 1
+            self.failures = 0
+        else:
+            self.failures += 1
+            self.successes = 0
 
     def add_rtt(self, rtt: float):
         self.avg_rtt = (self.WEIGHT * self.avg_rtt) + ((1 - self.WEIGHT) * rtt)
@@ -21,62 +34,207 @@ class HealthCheckInfo:
         
 
 class HealthCheckService:
-    """ Service that periodically performs health checks on a list of servers. """
-
-    def __init__(self, servers: typing.List[Server], server_lock: threading.Lock, interval=3, health_check_path="/health", timeout=1):
+    """
+    Service that periodically performs health checks on a list of servers. Every server is probed on its own jittered timer
+    by an asyncio task, so a slow or dead server only delays its own checks, with at most max_concurrency probes in flight.
+    After every status change it publishes an immutable tuple of the healthy servers (copy-on-write), so readers such as the
+    strategies never need a lock - they just use whichever snapshot was current when they looked.
+    """
+
+    def __init__(self, servers: typing.List[Server], interval=3, health_check_path="/health", timeout=1, shared_state=None,
+                 rise=1, fall=1, max_backoff=0, max_concurrency=256):
         self.servers = servers
-        self.server_lock = server_lock
         self.interval = interval
         self.health_check_path = health_check_path
         self.timeout = timeout
+        self.rise = rise  # consecutive successful probes before a down server is marked healthy
+        self.fall = fall  # consecutive failed probes before a healthy server is marked unhealthy
+        self.max_backoff = max_backoff  # longest check period for a server that stays down, <= interval disables backoff
+        self.max_concurrency = max_concurrency  # probes in flight at once (each holds a socket)
+
+        # With pre-forked workers the supervisor runs the checks, workers pick up changes through the shared version counter
+        self.shared_state = shared_state
+
+        # Callbacks (server, healthy) run whenever a server's health status flips
+        self.health_listeners: typing.List[typing.Callable[[Server, bool], None]] = []
+
+        # Callbacks (healthy servers tuple) run whenever a new snapshot is published
+        self.snapshot_listeners: typing.List[typing.Callable[[typing.Tuple[Server, ...]], None]] = []
+        self.publish_lock = threading.Lock()
+        self.pending_lock = threading.Lock()
+        self.publish_pending = False
+        self.loop = None  # the probe scheduler's event loop once it runs
+        self.tasks: typing.Dict[Server, asyncio.Task] = {}
+        self.version = self.shared_version()
+        self.healthy_servers: typing.Tuple[Server, ...] = tuple(s for s in servers if s.is_available())
+
+    @classmethod
+    def from_lb_opts(cls, servers: typing.List[Server], opts, shared_state=None):
+        """ Build the service from the health_check_* fields of LBOpts. """
+        return cls(servers, opts.health_check_interval, opts.health_check_path, opts.health_check_timeout, shared_state,
+                   opts.health_check_rise, opts.health_check_fall, opts.health_check_max_backoff, opts.health_check_concurrency)
+
+    def add_health_listener(self, listener: typing.Callable[[Server, bool], None]):
+        self.health_listeners.append(listener)
+
+    def add_snapshot_listener(self, listener: typing.Callable[[typing.Tuple[Server, ...]], None]):
+        """ Register listener and immediately hand it the current snapshot. """
+        self.snapshot_listeners.append(listener)
+        listener(self.healthy_servers)
+
+    def set_health(self, server: Server, healthy: bool):
+        """ Update the server's health status and return whether it changed. """
+        changed = server.is_healthy() != healthy
+        server.set_healthy(healthy)
+        return changed
+
+    def notify_health_change(self, server: Server):
+        self.publish_snapshot()
+        for listener in self.health_listeners:
+            listener(server, server.is_healthy())
+
+    def shared_version(self) -> int:
+        return self.shared_state.health_version.value if self.shared_state is not None else 0
+
+    def publish_snapshot(self):
+        """ Rebuild the tuple of available (healthy, not ejected) servers and swap it in. Only runs on a status change, never per connection. """
+        with self.publish_lock:
+            if self.shared_state is not None and self.version == self.shared_version():
+                with self.shared_state.health_version.get_lock():
+                    self.shared_state.health_version.value += 1
+            self.version = self.shared_version()
+            self.healthy_servers = tuple(s for s in self.servers if s.is_available())
+            for listener in self.snapshot_listeners:
+                listener(self.healthy_servers)
+
+    def request_publish(self):
+        """
+        Publish a new snapshot on a background thread, so the caller (a request thread or the event loop, e.g. a circuit
+        breaker opening) does not wait for the strategies to rebuild their rings and tables. Requests made before the
+        pending publish starts are folded into it.
+        """
+        with self.pending_lock:
+            if self.publish_pending:
+                return
+            self.publish_pending = True
+        threading.Thread(target=self._publish_pending, name="snapshot-publish", daemon=True).start()
+
+    def _publish_pending(self):
+        with self.pending_lock:
+            self.publish_pending = False
+        self.publish_snapshot()
+
+    def refresh(self):
+        """ Publish a new snapshot if another process (the worker supervisor) changed health since the last one. Cheap enough to call per connection. """
+        if self.shared_state is not None and self.version != self.shared_version():
+            self.publish_snapshot()
 
     def start(self):
-        def run():
-            while True:
-                self.check_health()
-                time.sleep(self.interval)
-
-        thread = threading.Thread(target=run)
+        """ Run the probe scheduler on its own event loop in a daemon thread. """
+        thread = threading.Thread(target=lambda: asyncio.run(self.run()), name="health-check")
         thread.daemon = True
         thread.start()
 
     def GET_request_string(self, path: str, host_ip: str) -> str:
         return f"GET {path} HTTP/1.1\r\nHost: {host_ip}\r\nConnection: close\r\n\r\n"
 
-    def check_health(self):
-        """ Perform health checks on all servers by sending GET requests to the configured health check path. Updates each server's health status based on the response (or lack thereof). """
-
-        for server in self.servers:
-            try:
-                start = time.time()
-
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                request = self.GET_request_string(self.health_check_path, server.ip)
-                sock.settimeout(self.timeout)
-                sock.connect((server.ip, HTTP_PORT))
-                sock.sendall(request.encode())
-                response = sock.recv(1024).decode()
-                sock.close()
-
-                end = time.time()
-
-                # Get RTT
-                rtt = end - start
-
-                # Update server health status
-                # We need to obtain the lock before modifying shared server state
-                with self.server_lock:
-                    if not server.get_additional_info("health_check_info"):
-                        server.set_additional_info("health_check_info", HealthCheckInfo())
-                    
-                    health_info:HealthCheckInfo = server.get_additional_info("health_check_info")
-                    health_info.add_rtt(rtt)
-                    
-                    if "200 OK" in response:
-                        server.set_healthy(True)
-                    else:
-                        server.set_healthy(False)
-
-            except Exception as e:
-                with self.server_lock:
-                    server.set_healthy(False)
\ No newline at end of file
+    def health_info(self, server: Server) -> HealthCheckInfo:
+        if not server.get_additional_info("health_check_info"):
+            server.set_additional_info("health_check_info", HealthCheckInfo())
+        return server.get_additional_info("health_check_info")
+
+    async def run(self):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.loop = asyncio.get_running_loop()
+        for server in list(self.servers):
+            self.start_schedule(server)
+        await asyncio.Event().wait()  # the probe tasks run until the process exits
+
+    def add_server(self, server: Server):
+        """ Start probing a server added to servers at runtime. """
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.start_schedule, server)
+
+    def remove_server(self, server: Server):
+        """ Stop probing a server removed from servers at runtime. """
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stop_schedule, server)
+
+    def start_schedule(self, server: Server):
+        if server not in self.tasks:
+            self.tasks[server] = self.loop.create_task(self.schedule(server))
+
+    def stop_schedule(self, server: Server):
+        task = self.tasks.pop(server, None)
+        if task is not None:
+            task.cancel()
+
+    def next_delay(self, server: Server) -> float:
+        """ The check interval, doubled for every failed probe past the fall threshold while the server is down (up to max_backoff). """
+        info = self.health_info(server)
+        if server.is_healthy() or self.max_backoff <= self.interval:
+            return self.interval
+        return min(self.max_backoff, self.interval * 2 ** min(max(0, info.failures - self.fall), 16))
+
+    async def schedule(self, server: Server):
+        """
+        Probe one server forever on its own timer. Deadlines advance from the previous deadline rather than from when the
+        probe finished, so probe time does not accumulate as drift, and each period is jittered so that servers do not
+        fall into lockstep.
+        """
+        loop = asyncio.get_running_loop()
+        next_probe = loop.time() + random.uniform(0, self.interval)  # spread the first round over one interval
+        while True:
+            await asyncio.sleep(max(0, next_probe - loop.time()))
+            await self.check_server(server)
+
+            next_probe += self.next_delay(server) * random.uniform(1 - JITTER, 1 + JITTER)
+            if next_probe < loop.time():
+                # Fell behind (probe slower than the interval) - probe again now rather than in a burst of catch-up probes
+                next_probe = loop.time()
+
+    async def check_server(self, server: Server):
+        """ Probe the server and update its health once it has passed rise / failed fall probes in a row. """
+        async with self.semaphore:
+            ok, rtt = await self.probe(server)
+
+        info = self.health_info(server)
+        if rtt is not None:
+            info.add_rtt(rtt)
+        info.record(ok)
+
+        changed = False
+        if ok and not server.is_healthy() and info.successes >= self.rise:
+            changed = self.set_health(server, True)
+        elif not ok and server.is_healthy() and info.failures >= self.fall:
+            changed = self.set_health(server, False)
+
+        if changed:
+            self.notify_health_change(server)
+
+    async def probe(self, server: Server) -> typing.Tuple[bool, float]:
+        """ GET the health check path on the server's port. Returns whether it answered 200, and the RTT (None without an answer). """
+        try:
+            if hasattr(asyncio, "timeout"):
+                # Python 3.11+: cancels in place instead of wrapping every probe in an extra task like wait_for
+                async with asyncio.timeout(self.timeout):
+                    return await self._probe(server)
+            return await asyncio.wait_for(self._probe(server), self.timeout)
+        except Exception:
+            return False, None
+
+    async def _probe(self, server: Server) -> typing.Tuple[bool, float]:
+        # Plain non-blocking socket calls rather than streams - far less per-probe overhead with thousands of servers
+        loop = asyncio.get_running_loop()
+        start = time.time()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            await loop.sock_connect(sock, (server.ip, server.port))
+            await loop.sock_sendall(sock, self.GET_request_string(self.health_check_path, server.ip).encode())
+            response = await loop.sock_recv(sock, 1024)
+        finally:
+            sock.close()
+
+        rtt = time.time() - start
+        return response.split(b" ", 2)[1:2] == [b"200"], rtt
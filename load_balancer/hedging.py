@@ -0,0 +1,41 @@
+import collections
+import threading
+
+
+class HedgeOpts:
+    def __init__(self, enabled=False, percentile=95, min_delay=0.005, max_delay=1.0, budget=0.05, min_hedges=5, methods=("GET", "HEAD")):
+        self.enabled = enabled
+        self.percentile = percentile  # hedge once an attempt is slower than this percentile of recent ones
+        self.min_delay = min_delay  # seconds, bounds on the percentile based delay
+        self.max_delay = max_delay
+        self.budget = budget  # hedges allowed as a fraction of requests, so an incident is not met with extra load
+        self.min_hedges = min_hedges  # hedges always available on top of the budget
+        self.methods = methods  # l7 requests that may be sent twice - idempotent and without a body
+
+
+class LatencyTracker:
+    """ Recent latency samples and a cached percentile over them, recomputed every refresh_every samples rather than per lookup. """
+
+    def __init__(self, percentile=95, window=1000, refresh_every=100, default=0.05):
+        self.fraction = percentile / 100
+        self.samples = collections.deque(maxlen=window)
+        self.refresh_every = refresh_every
+        self.since_refresh = 0
+        self.value = default  # used until enough samples exist
+        self.lock = threading.Lock()
+
+    def record(self, latency: float):
+        self.samples.append(latency)
+        self.since_refresh += 1
+        if self.since_refresh >= self.refresh_every:
+            self.refresh()
+
+    def refresh(self):
+        with self.lock:
+            self.since_refresh = 0
+            ordered = sorted(self.samples)
+            if ordered:
+                self.value = ordered[min(len(ordered) - 1, int(len(ordered) * self.fraction))]
+
+    def delay(self, min_delay: float, max_delay: float) -> float:
+        return min(max_delay, max(min_delay, self.value))
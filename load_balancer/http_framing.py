@@ -0,0 +1,183 @@
+import socket
+from http_parser import HeaderParser, MAX_HEAD_SIZE
+
+# Special body lengths besides a plain Content-Length
+CHUNKED = -1
+UNTIL_CLOSE = -2
+
+
+class HTTPFramingError(Exception):
+    """ Raised when a peer sends something that cannot be framed as HTTP/1.x. """
+
+
+class HTTPHead:
+    """ Start line and headers of one HTTP/1.x request or response, backed by the HeaderParser that read it. """
+
+    def __init__(self, parser: HeaderParser):
+        self.parser = parser
+        self.raw = parser.head()
+
+    def get_header(self, name: str, default=None):
+        return self.parser.get(name, default)
+
+    def has_token(self, name: str, token: str) -> bool:
+        return self.parser.has_token(name, token)
+
+    def content_length(self) -> int:
+        try:
+            length = int(self.get_header("content-length", "0"))
+        except ValueError:
+            raise HTTPFramingError(f"Invalid Content-Length: {self.get_header('content-length')}")
+        if length < 0:
+            raise HTTPFramingError(f"Invalid Content-Length: {length}")
+        return length
+
+    def keep_alive(self) -> bool:
+        """ HTTP/1.1 is persistent unless it says close, HTTP/1.0 only if it asks for keep-alive. """
+        if self.version == "HTTP/1.1":
+            return not self.has_token("connection", "close")
+        return self.has_token("connection", "keep-alive")
+
+
+class RequestHead(HTTPHead):
+
+    def __init__(self, parser: HeaderParser):
+        super().__init__(parser)
+        self.method, self.path, self.version = parser.method, parser.path, parser.start_line_token(2)
+        if not self.method or not self.path or not (self.version or "").startswith("HTTP/"):
+            raise HTTPFramingError(f"Malformed request line: {bytes(self.raw[:80])!r}")
+
+    def body_length(self) -> int:
+        if self.has_token("transfer-encoding", "chunked"):
+            return CHUNKED
+        return self.content_length()
+
+    def expects_continue(self) -> bool:
+        """ Whether the client waits for a 100 Continue before sending its body (HTTP/1.0 clients must not be sent one). """
+        return self.version == "HTTP/1.1" and self.has_token("expect", "100-continue") and self.body_length() != 0
+
+    def without_header(self, name: str) -> bytes:
+        """ The raw head with every name header line removed. """
+        name = name.lower().encode("latin-1")
+        lines = bytes(self.raw).split(b"\r\n")
+        kept = lines[:1] + [line for line in lines[1:] if line.split(b":", 1)[0].strip().lower() != name]
+        return b"\r\n".join(kept)
+
+
+class ResponseHead(HTTPHead):
+
+    def __init__(self, parser: HeaderParser):
+        super().__init__(parser)
+        self.version = parser.start_line_token(0)
+        status = parser.start_line_token(1) or ""
+        if not status.isdigit():
+            raise HTTPFramingError(f"Malformed status line: {bytes(self.raw[:80])!r}")
+        self.status = int(status)
+
+    def is_interim(self) -> bool:
+        return 100 <= self.status < 200
+
+    def body_length(self, request_method: str) -> int:
+        if request_method == "HEAD" or self.is_interim() or self.status in (204, 304):
+            return 0
+        if self.has_token("transfer-encoding", "chunked"):
+            return CHUNKED
+        if self.get_header("content-length") is not None:
+            return self.content_length()
+        return UNTIL_CLOSE
+
+    def reusable(self, request_method: str) -> bool:
+        """ Whether the server connection is left at a clean boundary and may carry another request. """
+        return self.keep_alive() and self.body_length(request_method) != UNTIL_CLOSE
+
+
+class BufferedSocket:
+    """ Socket wrapper with a read buffer so that HTTP framing can stop at a message boundary without losing what follows it. """
+
+    def __init__(self, sock: socket.socket, buf_size=4096):
+        self.sock = sock
+        self.buf_size = buf_size
+        self.buf = bytearray()
+
+    def _fill(self) -> bool:
+        data = self.sock.recv(self.buf_size)
+        if not data:
+            return False
+        self.buf += data
+        return True
+
+    def read_head(self) -> HeaderParser:
+        """ Read up to and including the blank line ending a head. Returns None if the peer closed before sending anything. """
+        parser = HeaderParser()
+        data, self.buf = self.buf, bytearray()
+        while not parser.feed(data):
+            data = self.sock.recv(self.buf_size)
+            if not data:
+                if parser.buf:
+                    raise HTTPFramingError("Connection closed in the middle of a header section")
+                return None
+        self.buf = bytearray(parser.leftover())
+        return parser
+
+    def read_line(self) -> bytes:
+        while True:
+            end = self.buf.find(b"\r\n")
+            if end != -1:
+                line = bytes(self.buf[:end + 2])
+                del self.buf[:end + 2]
+                return line
+            if len(self.buf) > MAX_HEAD_SIZE:
+                raise HTTPFramingError("Line too long")
+            if not self._fill():
+                raise HTTPFramingError("Connection closed in the middle of a line")
+
+    def forward_body(self, dst: socket.socket, length: int):
+        """ Forward a message body framed by length (a byte count, CHUNKED or UNTIL_CLOSE) to dst. """
+        if length == CHUNKED:
+            self.forward_chunked(dst)
+        elif length == UNTIL_CLOSE:
+            self.forward_until_close(dst)
+        else:
+            self.forward_exact(dst, length)
+
+    def forward_exact(self, dst: socket.socket, length: int):
+        if self.buf:
+            buffered = min(length, len(self.buf))
+            dst.sendall(self.buf[:buffered])
+            del self.buf[:buffered]
+            length -= buffered
+        while length > 0:
+            data = self.sock.recv(min(self.buf_size, length))
+            if not data:
+                raise HTTPFramingError("Connection closed in the middle of a body")
+            dst.sendall(data)
+            length -= len(data)
+
+    def forward_chunked(self, dst: socket.socket):
+        while True:
+            size_line = self.read_line()
+            dst.sendall(size_line)
+            try:
+                size = int(size_line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise HTTPFramingError(f"Invalid chunk size line: {size_line[:80]!r}")
+
+            if size == 0:
+                # Trailer section ends with an empty line
+                while True:
+                    line = self.read_line()
+                    dst.sendall(line)
+                    if line == b"\r\n":
+                        return
+
+            self.forward_exact(dst, size + 2)  # chunk data followed by CRLF
+
+    def forward_until_close(self, dst: socket.socket):
+        if self.buf:
+            dst.sendall(self.buf)
+            self.buf.clear()
+        while True:
+            data = self.sock.recv(self.buf_size)
+            if not data:
+                return
+            dst.sendall(data)
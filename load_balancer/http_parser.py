@@ -0,0 +1,150 @@
+MAX_HEAD_SIZE = 65536
+HEAD_END = b"\r\n\r\n"
+
+
+class HeaderParseError(Exception):
+    """ Raised when a head is malformed or grows past MAX_HEAD_SIZE without ending. """
+
+
+class HeaderParser:
+    """
+    Incremental HTTP/1.x head parser. Bytes are fed as they arrive (from any number of recv calls) until the blank line
+    ending the head, then the start line and header names are indexed by offset. Nothing is decoded up front - only the
+    values that are looked up, so routing on one header costs the same no matter how large the rest of the head is.
+    """
+
+    def __init__(self, max_size=MAX_HEAD_SIZE):
+        self.max_size = max_size
+        self.buf = bytearray()
+        self.head_end = -1  # offset just past the blank line once complete
+        self._scanned = 0
+        self._start_line = ()  # spans of the (up to) three start line tokens
+        self._headers = {}  # lower case header name bytes -> list of value spans
+
+    def feed(self, data) -> bool:
+        """ Append bytes/memoryview data. Returns True once the head is complete - extra bytes after it are kept in leftover(). """
+        if self.head_end != -1:
+            self.buf += data
+            return True
+
+        self.buf += data
+        # Only search the new bytes (plus 3 in case the terminator straddles two feeds)
+        end = self.buf.find(HEAD_END, max(0, self._scanned - 3))
+        if end == -1:
+            self._scanned = len(self.buf)
+            if self._scanned > self.max_size:
+                raise HeaderParseError("Header section too large")
+            return False
+
+        self.head_end = end + len(HEAD_END)
+        self._index()
+        return True
+
+    def is_complete(self) -> bool:
+        return self.head_end != -1
+
+    def head(self) -> memoryview:
+        return memoryview(self.buf)[:self.head_end]
+
+    def leftover(self) -> bytes:
+        return bytes(self.buf[self.head_end:])
+
+    def _index(self):
+        buf = self.buf
+        line_end = buf.find(b"\r\n")
+
+        # Start line: split on the first two spaces only, a reason phrase may contain more
+        spans = []
+        pos = 0
+        for _ in range(2):
+            space = buf.find(b" ", pos, line_end)
+            if space == -1:
+                break
+            spans.append((pos, space))
+            pos = space + 1
+        spans.append((pos, line_end))
+        self._start_line = tuple(spans)
+
+        pos = line_end + 2
+        while pos < self.head_end - 2:
+            line_end = buf.find(b"\r\n", pos)
+            colon = buf.find(b":", pos, line_end)
+            if colon == -1:
+                raise HeaderParseError(f"Malformed header line: {bytes(buf[pos:line_end])[:80]!r}")
+
+            name = bytes(buf[pos:colon]).strip().lower()
+            value_start, value_end = colon + 1, line_end
+            while value_start < value_end and buf[value_start] in b" \t":
+                value_start += 1
+            while value_end > value_start and buf[value_end - 1] in b" \t":
+                value_end -= 1
+            self._headers.setdefault(name, []).append((value_start, value_end))
+            pos = line_end + 2
+
+    def start_line_token(self, index: int):
+        """ Token of the start line: method/path/version for requests, version/status/reason for responses. """
+        if index >= len(self._start_line):
+            return None
+        start, end = self._start_line[index]
+        return self.buf[start:end].decode("latin-1")
+
+    def get(self, name: str, default=None):
+        """ Case-insensitive header lookup. Repeated headers are joined with ", " as HTTP defines. """
+        spans = self._headers.get(name.lower().encode("latin-1"))
+        if not spans:
+            return default
+        return ", ".join(self.buf[start:end].decode("latin-1") for start, end in spans)
+
+    def has(self, name: str) -> bool:
+        return name.lower().encode("latin-1") in self._headers
+
+    def has_token(self, name: str, token: str) -> bool:
+        """ Whether a comma separated header (Connection, Transfer-Encoding) contains the token. """
+        return token in [t.strip().lower() for t in self.get(name, "").split(",")]
+
+    @property
+    def method(self):
+        return self.start_line_token(0)
+
+    @property
+    def path(self):
+        return self.start_line_token(1)
+
+    @property
+    def host(self):
+        return self.get("host")
+
+    @property
+    def sid(self):
+        return self.get("sid")
+
+    def cookie(self, name: str = None):
+        """ The whole Cookie header, or the value of a single cookie when a name is given. """
+        cookies = self.get("cookie")
+        if cookies is None or name is None:
+            return cookies
+        for pair in cookies.split(";"):
+            key, sep, value = pair.strip().partition("=")
+            if sep and key == name:
+                return value
+        return None
+
+
+def get_affinity_key(key: str, source_ip, request: HeaderParser = None):
+    """
+    Value a hashing strategy should hash for the configured key: "source_ip", "sid", "host", "path", "cookie" (the whole header)
+    or "cookie:<name>". Falls back to the source IP when there is no request or it lacks the key.
+    """
+    value = None
+    if request is not None and request.is_complete():
+        if key == "sid":
+            value = request.sid
+        elif key == "host":
+            value = request.host
+        elif key == "path":
+            value = request.path
+        elif key == "cookie":
+            value = request.cookie()
+        elif key.startswith("cookie:"):
+            value = request.cookie(key[len("cookie:"):])
+    return value or source_ip
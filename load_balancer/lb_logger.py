@@ -0,0 +1,150 @@
+import atexit
+import collections
+import os
+import sys
+import threading
+import time
+from serv_obj import AtomicCounter
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+LEVELS = {name.lower(): level for level, name in LEVEL_NAMES.items()}
+
+
+class LogOpts:
+    def __init__(self, path="lb.log", level=WARNING, capacity=65536, max_bytes=10 * 1024 * 1024, backup_count=3, echo=True, flush_interval=0.2):
+        self.path = path  # None to only echo to stdout
+        self.level = level  # records below this level are dropped before they are formatted
+        self.capacity = capacity  # records buffered before new ones are dropped
+        self.max_bytes = max_bytes  # rotate the file once it grows past this, 0 to never rotate
+        self.backup_count = backup_count  # rotated files kept as path.1 .. path.N
+        self.echo = echo  # also write records to stdout
+        self.flush_interval = flush_interval  # seconds the writer sleeps between batches
+
+
+class AsyncLogger:
+    """
+    Logger whose callers never touch a file or format a string. log() checks the level, then appends the unformatted
+    (time, level, msg, args) record to a bounded deque - appends and pops are atomic in CPython, so producers take no lock.
+    A background thread formats whatever has accumulated and writes it as one batch to a single open file handle, rotating
+    by size. When the buffer is full new records are counted as dropped instead of blocking the data plane.
+    """
+
+    def __init__(self, opts: LogOpts = LogOpts()):
+        self.opts = opts
+        self.level = opts.level
+        self.records = collections.deque()
+        self.dropped = AtomicCounter()
+        self.written = 0
+        self.rotations = 0
+
+        self.file = None
+        self.wake = threading.Event()
+        self.write_lock = threading.Lock()  # only contended by flush() racing the writer thread
+        self.writer = threading.Thread(target=self._run, name="lb-logger", daemon=True)
+        self.writer.start()
+        atexit.register(self.flush)
+
+    def enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, level: int, msg: str, *args):
+        """ Queue msg % args for writing. Cheap when level is filtered out - nothing is formatted or allocated. """
+        if level < self.level:
+            return
+        if len(self.records) >= self.opts.capacity:
+            self.dropped.add(1)
+            return
+        self.records.append((time.time(), level, msg, args))
+        if len(self.records) >= self.opts.capacity // 2:
+            self.wake.set()
+
+    def debug(self, msg: str, *args):
+        self.log(DEBUG, msg, *args)
+
+    def info(self, msg: str, *args):
+        self.log(INFO, msg, *args)
+
+    def warning(self, msg: str, *args):
+        self.log(WARNING, msg, *args)
+
+    def error(self, msg: str, *args):
+        self.log(ERROR, msg, *args)
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self.records),
+            "written": self.written,
+            "dropped": self.dropped.value,
+            "rotations": self.rotations,
+        }
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.opts.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        """ Format and write everything queued so far. """
+        with self.write_lock:
+            lines = []
+            while self.records:
+                lines.append(self._format(*self.records.popleft()))
+            if not lines:
+                return
+
+            batch = "".join(lines)
+            if self.opts.echo:
+                sys.stdout.write(batch)
+                sys.stdout.flush()
+            if self.opts.path is not None:
+                self._write_file(batch)
+            self.written += len(lines)
+
+    def _format(self, timestamp: float, level: int, msg: str, args: tuple) -> str:
+        if args:
+            try:
+                msg = msg % args
+            except (TypeError, ValueError) as e:
+                msg = f"{msg} {args!r} (format error: {e})"
+        stamp = time.strftime("%H:%M:%S", time.localtime(timestamp))
+        return f"[LB] {stamp}.{int(timestamp * 1000) % 1000:03d} {LEVEL_NAMES.get(level, level)} {msg}\n"
+
+    def _write_file(self, batch: str):
+        try:
+            # Another worker process may have rotated the file under us - follow the path to the new file
+            if self.file is not None and os.fstat(self.file.fileno()).st_ino != self._path_inode():
+                self.file.close()
+                self.file = None
+            if self.file is None:
+                self.file = open(self.opts.path, "a")
+
+            self.file.write(batch)
+            self.file.flush()
+            if self.opts.max_bytes and self.file.tell() >= self.opts.max_bytes:
+                self._rotate()
+        except OSError as e:
+            print(f"[LB] Failed to write log file {self.opts.path}: {e}", file=sys.stderr)
+
+    def _path_inode(self):
+        try:
+            return os.stat(self.opts.path).st_ino
+        except FileNotFoundError:
+            return None
+
+    def _rotate(self):
+        self.file.close()
+        self.file = None
+        for i in range(self.opts.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.opts.path}.{i}"):
+                os.replace(f"{self.opts.path}.{i}", f"{self.opts.path}.{i + 1}")
+        if self.opts.backup_count > 0:
+            os.replace(self.opts.path, f"{self.opts.path}.1")
+        else:
+            os.remove(self.opts.path)
+        self.rotations += 1
@@ -1,26 +1,52 @@
 import random
 import socket
 import select
-from serv_obj import Server
+import selectors
+from serv_obj import Server, AtomicCounter
 from strategies.lb_strategy import LBStrategy
 import typing
 import threading
 from health_check import HealthCheckService
 from load_shedder import LoadShedder, LoadShedParams
 from http_helper import HTTPResponse
+from forwarding import Forwarder
+from session_store import SessionStore
+from outlier_detection import OutlierDetector, OutlierOpts
+from circuit_breaker import CircuitBreaker, CircuitBreakerOpts
+from retry import RetryBudget, RetryOpts
+from hedging import HedgeOpts, LatencyTracker
+from response_time import ResponseTimeEWMA, ExchangeTimer
+from lb_logger import AsyncLogger, LogOpts, DEBUG
+from connection_pool import ConnectionPool, PoolOpts, PoolExhaustedError
+from http_parser import HeaderParser, HeaderParseError
+from http_framing import BufferedSocket, RequestHead, ResponseHead, HTTPFramingError, UNTIL_CLOSE
+import signal
+import concurrent.futures
 import time
+import weakref
 
 SERVERS = []
 BUF_SIZE = 4096
 TIMEOUT = 5
-session_map = {}
-STICKY_TIMEOUT = 5
+STICKY_TIMEOUT = 5  # default sticky session timeout (seconds)
+STICKY_MAX_SESSIONS = 100000
+LISTEN_BACKLOG = socket.SOMAXCONN
 
 SHED_RESPONSE = (
     503, "The server is currently experiencing high load, please try again later.")
 OVERLOADED_RESPONSE = (
     503, "No healthy servers available, please try again later.")
 INTERNAL_SERVER_ERROR_RESPONSE = (500, "Internal Server Error")
+CONTINUE_RESPONSE = b"HTTP/1.1 100 Continue\r\n\r\n"  # sent to clients that wait with Expect: 100-continue (l7)
+
+
+class UnknownServerError(Exception):
+    """ Raised by the runtime fleet changes for a server name the load balancer does not have. """
+
+
+def check_weight(weight):
+    if not isinstance(weight, int) or isinstance(weight, bool) or weight < 1:
+        raise ValueError(f"weight must be an integer >= 1, got {weight!r}")
 
 
 class LBOpts:
@@ -31,7 +57,25 @@ class LBOpts:
                  health_check_path="/health",
                  health_check_timeout=2,
                  load_shedding_enabled=False,
-                 load_shed_params: LoadShedParams = LoadShedParams()):
+                 load_shed_params: LoadShedParams = LoadShedParams(),
+                 data_plane="threaded",
+                 workers=1,
+                 cpu_affinity=False,
+                 forwarding_mode="copy",
+                 pool_opts: PoolOpts = PoolOpts(),
+                 proxy_mode="l4",
+                 sticky_timeout=STICKY_TIMEOUT,
+                 sticky_max_sessions=STICKY_MAX_SESSIONS,
+                 listen_backlog=LISTEN_BACKLOG,
+                 log_opts=LogOpts(),
+                 health_check_rise=1,
+                 health_check_fall=1,
+                 health_check_max_backoff=0,
+                 health_check_concurrency=256,
+                 outlier_opts: OutlierOpts = OutlierOpts(),
+                 breaker_opts: CircuitBreakerOpts = CircuitBreakerOpts(),
+                 retry_opts: RetryOpts = RetryOpts(),
+                 hedge_opts: HedgeOpts = HedgeOpts()):
 
         self.sticky_sessions = sticky_sessions
         self.debug_mode = debug_mode
@@ -40,135 +84,550 @@ class LBOpts:
         self.health_check_timeout = health_check_timeout
         self.load_shedding_enabled = load_shedding_enabled
         self.load_shed_params = load_shed_params
+        self.data_plane = data_plane
+        self.workers = workers
+        self.cpu_affinity = cpu_affinity
+        self.forwarding_mode = forwarding_mode
+        self.pool_opts = pool_opts
+        self.proxy_mode = proxy_mode
+        self.sticky_timeout = sticky_timeout
+        self.sticky_max_sessions = sticky_max_sessions
+        self.listen_backlog = listen_backlog  # capped by net.core.somaxconn
+        self.log_opts = log_opts  # debug_mode lowers the level to DEBUG
+        self.health_check_rise = health_check_rise
+        self.health_check_fall = health_check_fall
+        self.health_check_max_backoff = health_check_max_backoff
+        self.health_check_concurrency = health_check_concurrency
+        self.outlier_opts = outlier_opts
+        self.breaker_opts = breaker_opts
+        self.retry_opts = retry_opts
+        self.hedge_opts = hedge_opts
 
 
 class LoadBalancer(object):
 
-    def __init__(self, ip, port, servers: typing.List[Server], lb_strategy: LBStrategy, opts: LBOpts = LBOpts()):
+    def __init__(self, ip, port, servers: typing.List[Server], lb_strategy: LBStrategy, opts: LBOpts = LBOpts(), shared_state=None):
         self.ip = ip
         self.port = port
         self.servers = servers
         self.lb_strategy = lb_strategy
         self.opts = opts
 
-        self.server_lock = threading.Lock()
+        self.logger = AsyncLogger(opts.log_opts)
+        if opts.debug_mode:
+            self.logger.level = DEBUG
+
+        # Set when this LB is one of several pre-forked workers (see workers.py)
+        self.shared_state = shared_state
+        if shared_state is None:
+            self.session_store = SessionStore(opts.sticky_timeout, opts.sticky_max_sessions)
+        else:
+            self.session_store = shared_state.sessions
 
         # Initialize the load balancer socket - TCP
         socket.setdefaulttimeout(TIMEOUT)
         self.lb_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.lb_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.shared_state is not None:
+            # Every worker binds the same port, the kernel spreads incoming connections between them
+            self.lb_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.lb_socket.bind((self.ip, self.port))
 
-        # Initialize Health Check Service
-        self.health_check_service = HealthCheckService(
-            self.servers, self.server_lock, self.opts.health_check_interval, self.opts.health_check_path, self.opts.health_check_timeout)
-        self.health_check_service.start()
+        # Initialize Health Check Service - workers share the results of the one run by the supervisor instead
+        self.health_check_service = HealthCheckService.from_lb_opts(self.servers, self.opts, self.shared_state)
+        self.health_check_service.add_health_listener(self.on_health_change)
+        self.health_check_service.add_snapshot_listener(self.update_strategy_healthy)
 
-        # Load shedding parameters
-        self.load_shedder = LoadShedder(self.opts.load_shed_params)
+        # Passive health checking - ejections republish the snapshot so strategies skip the ejected server
+        self.outlier_detector = OutlierDetector(self.servers, self.opts.outlier_opts, self.health_check_service.request_publish, self.logger)
+
+        # Per-server circuit breakers and connection pools
+        for server in self.servers:
+            self.setup_server(server)
+        self.admin_lock = threading.RLock()  # serializes runtime fleet changes and config reloads
 
-        # Start listening for incoming connections - max 5 queued connections
-        self.lb_socket.listen(5)
+        # Connect failures are retried on another server while the budget lasts
+        self.retry_budget = RetryBudget(self.opts.retry_opts.budget, self.opts.retry_opts.min_retries)
 
-    def print_debug(self, msg):
-        if self.opts.debug_mode:
-            print(f"[LB] {msg}")
+        # Hedging: a second attempt on another server once the first is slower than a percentile of recent ones
+        self.hedge_budget = RetryBudget(self.opts.hedge_opts.budget, self.opts.hedge_opts.min_hedges)
+        self.hedge_wins = AtomicCounter()
+        self.connect_latency = LatencyTracker(self.opts.hedge_opts.percentile)
+        self.ttfb_latency = LatencyTracker(self.opts.hedge_opts.percentile)
+        self.hedge_executor = self.make_hedge_executor()
+        if self.shared_state is None:
+            self.health_check_service.start()
 
-            with open("lb.log", "a") as f:
-                f.write(f"[LB] {msg}\n")
+        # Load shedding parameters
+        self.load_shedder = LoadShedder(
+            self.opts.load_shed_params, None if self.shared_state is None else self.shared_state.total_connections)
+
+        # Start listening for incoming connections. Non-blocking so the accept loop can drain the queue until it is empty
+        self.lb_socket.listen(self.opts.listen_backlog)
+        self.lb_socket.setblocking(False)
+
+    def make_hedge_executor(self):
+        """ Threads that run hedged connects, so the first one to connect can win. """
+        if not self.opts.hedge_opts.enabled:
+            return None
+        return concurrent.futures.ThreadPoolExecutor(max_workers=512, thread_name_prefix="connect")
+
+    def setup_server(self, server: Server):
+        """ Attach the per-server state the data plane uses. Circuit breaker state changes republish the snapshot off the data path. """
+        server.circuit_breaker = CircuitBreaker(server.name, self.opts.breaker_opts, self.health_check_service.request_publish, self.logger)
+        server.set_additional_info('connection_pool', ConnectionPool(server, self.opts.pool_opts))
+        server.set_additional_info('response_time', ResponseTimeEWMA())
+
+    def find_server(self, name: str) -> Server:
+        for server in self.servers:
+            if server.name == name:
+                return server
+        raise UnknownServerError(f"No server named {name}")
+
+    def add_server(self, server: Server):
+        """ Add a backend at runtime. It is probed from now on and selectable as soon as it counts as available. """
+        with self.admin_lock:
+            if any(s.name == server.name for s in self.servers):
+                raise ValueError(f"A server named {server.name} already exists")
+            check_weight(server.additional_info.get('weight', 1))
+            self.setup_server(server)
+            self.outlier_detector.add_server(server)
+            # The list is shared with the health checker and outlier detector, so they see the new server too
+            self.servers.append(server)
+            self.lb_strategy.add_server(server)
+            self.health_check_service.add_server(server)
+            self.health_check_service.publish_snapshot()
+        self.logger.info("Added server %s at %s:%s", server.name, server.ip, server.port)
+
+    def remove_server(self, name: str):
+        """ Remove a backend at runtime. It gets no new connections; connections already open to it finish normally. """
+        with self.admin_lock:
+            server = self.find_server(name)
+            server.draining = True
+            self.servers.remove(server)
+            self.outlier_detector.remove_server(server)
+            self.lb_strategy.remove_server(server)
+            self.health_check_service.remove_server(server)
+            self.health_check_service.publish_snapshot()
+        server.get_additional_info('connection_pool').evict_idle()
+        self.logger.info("Removed server %s (%s connections still open)", name, server.get_active_connections())
+
+    def drain_server(self, name: str, draining=True):
+        """ Stop (or resume) sending new connections to a backend, e.g. before maintenance. Open connections are not touched. """
+        with self.admin_lock:
+            server = self.find_server(name)
+            server.draining = draining
+            self.health_check_service.publish_snapshot()
+        if draining:
+            server.get_additional_info('connection_pool').evict_idle()
+        self.logger.info("%s server %s", "Draining" if draining else "Undrained", name)
+
+    def set_server_weight(self, name: str, weight: int):
+        check_weight(weight)  # before anything is written, so a bad weight leaves the server as it was
+        with self.admin_lock:
+            server = self.find_server(name)
+            server.set_additional_info('weight', weight)
+            self.lb_strategy.server_weight_changed(server)
+        self.logger.info("Set weight of server %s to %s", name, weight)
+
+    def apply_config(self, servers: typing.List[Server], opts: LBOpts, strategy_factory=None) -> typing.List[str]:
+        """
+        Apply a reloaded config. The fleet is diffed by name (a changed address is a remove plus an add), so unchanged
+        servers keep their connections, pools and health. strategy_factory, if given, builds the new strategy over the
+        updated fleet. Returns the changes made.
+        """
+        changes = []
+        with self.admin_lock:
+            running = {server.name: server for server in self.servers}
+            wanted = {server.name: server for server in servers}
+            for name, server in running.items():
+                new = wanted.get(name)
+                if new is None or (new.ip, new.port) != (server.ip, server.port):
+                    self.remove_server(name)
+                    changes.append(f"removed {name}")
+            for name, new in wanted.items():
+                server = running.get(name)
+                weight = new.additional_info.get('weight', 1)
+                if server is None or (new.ip, new.port) != (server.ip, server.port):
+                    self.add_server(new)
+                    changes.append(f"added {name}")
+                elif weight != server.additional_info.get('weight', 1):
+                    self.set_server_weight(name, weight)
+                    changes.append(f"weight of {name} set to {weight}")
+            if strategy_factory is not None:
+                self.swap_strategy(strategy_factory(self.servers))
+                changes.append(f"strategy {type(self.lb_strategy).__name__}")
+            self.apply_opts(opts)
+        return changes
+
+    def swap_strategy(self, lb_strategy: LBStrategy):
+        """
+        Replace the strategy with one assignment. Selections already running finish on the old one, which is freed once
+        the last of them lets go. Holding the publish lock means no health snapshot can fall between the two.
+        """
+        with self.health_check_service.publish_lock:
+            lb_strategy.update_healthy(self.health_check_service.healthy_servers)
+            old, self.lb_strategy = self.lb_strategy, lb_strategy
+        weakref.finalize(old, self.logger.info, "Previous strategy %s released", type(old).__name__)
+
+    def apply_opts(self, opts: LBOpts):
+        """ Swap in reloaded options and push them to the components that copied theirs at startup. """
+        self.opts = opts
+        self.logger.level = DEBUG if opts.debug_mode else opts.log_opts.level
+        health_check_service = self.health_check_service
+        health_check_service.interval = opts.health_check_interval
+        health_check_service.health_check_path = opts.health_check_path
+        health_check_service.timeout = opts.health_check_timeout
+        health_check_service.rise = opts.health_check_rise
+        health_check_service.fall = opts.health_check_fall
+        health_check_service.max_backoff = opts.health_check_max_backoff
+        self.load_shedder.opts = opts.load_shed_params
+
+    def update_strategy_healthy(self, healthy_servers):
+        """ Snapshot listener that follows strategy swaps instead of holding on to the first strategy. """
+        self.lb_strategy.update_healthy(healthy_servers)
+
+    def server_stats(self) -> list:
+        return [{
+            "name": server.name,
+            "ip": server.ip,
+            "port": server.port,
+            "weight": server.additional_info.get('weight', 1),
+            "healthy": server.is_healthy(),
+            "available": server.is_available(),
+            "draining": server.draining,
+            "ejected": server.ejected,
+            "active_connections": server.get_active_connections(),
+            "response_time": server.get_additional_info('response_time').total(),
+            "ttfb": server.get_additional_info('response_time').ttfb(),
+        } for server in list(self.servers)]
+
+    def print_debug(self, msg, *args):
+        """ Log msg % args at DEBUG. Pass values as args rather than an f-string so nothing is formatted when debug is off. """
+        if self.logger.level <= DEBUG:
+            self.logger.log(DEBUG, msg, *args)
+
+    def on_health_change(self, server: Server, healthy: bool):
+        if not healthy:
+            server.get_additional_info('connection_pool').evict_idle()
+
+    def pool_stats(self) -> dict:
+        """ Hit/miss/eviction counters of every backend connection pool, keyed by server name. """
+        return {server.name: server.get_additional_info('connection_pool').stats() for server in self.servers}
+
+    def print_stats(self, signum=None, frame=None):
+        for name, stats in self.pool_stats().items():
+            print(f"[LB] Pool {name}: {stats}")
+        if self.opts.sticky_sessions:
+            print(f"[LB] Sticky sessions: {self.session_store.stats()}")
+        print(f"[LB] Outlier detection: {self.outlier_detector.stats_summary()}")
+        for server in self.servers:
+            print(f"[LB] Circuit breaker {server.name}: {server.circuit_breaker.stats()}")
+        print(f"[LB] Retry budget: {self.retry_budget.stats()}")
+        if self.opts.hedge_opts.enabled:
+            print(f"[LB] Hedging: {dict(self.hedge_budget.stats(), wins=self.hedge_wins.value)}")
+        print(f"[LB] Logger: {self.logger.stats()}")
 
     def start_lb(self):
+        # kill -USR1 <pid> dumps the connection pool and sticky session metrics
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, self.print_stats)
+
         self.print_debug("Load Balancer started, waiting for connections...")
+        selector = selectors.DefaultSelector()  # epoll on Linux
+        selector.register(self.lb_socket, selectors.EVENT_READ)
         while True:
-            # Blocks until one or more sockets (fd) are ready for IO
-            read_sockets, _, _ = select.select([self.lb_socket], [], [])
-            for sock in read_sockets:
-                if sock == self.lb_socket:
-                    # New incoming connection
-                    self.accept_connection()
-
-    def get_sid(self, req):
-        for header in req.split('\r\n'):
-            if 'SID:' in header:
-                return header.split(' ')[1]
-        return None
-
-    def accept_connection(self):
-        """ Accept a new client connection, determine the appropriate server to forward to using the configured load balancing strategy, and spawn a thread to handle the connection. """
-        
-        client_sock, client_addr = self.lb_socket.accept()
-
-        # Get the server to forward to - acquire lock since health check may modify server states
-        server = None
-        sid = None
-        req = None
+            # Blocks until the listener has pending connections, then accepts all of them
+            for _ in selector.select():
+                self.accept_connections()
 
-        if self.opts.sticky_sessions:
+    def accept_connections(self):
+        """ Accept every pending connection so a burst costs one wakeup rather than one per client. """
+        while True:
             try:
-                req = client_sock.recv(BUF_SIZE, socket.MSG_PEEK).decode()
-                # If client does not sent SID, use their IP instead for sticky
-                sid = self.get_sid(req) or client_addr[0]
+                client_sock, client_addr = self.lb_socket.accept()
+            except BlockingIOError:
+                return
+            except OSError as e:
+                # e.g. out of file descriptors - leave the rest queued until the next wakeup
+                self.print_debug("Failed to accept connection: %s", e)
+                return
+            self.accept_connection(client_sock, client_addr)
+
+    def accept_connection(self, client_sock: socket.socket, client_addr):
+        """ Spawn a thread to handle a newly accepted client connection. """
+
+        if self.opts.proxy_mode == "l7":
+            # Servers are chosen per request once the request heads are read
+            threading.Thread(target=self.handle_http_connection, args=(
+                client_sock, client_addr)).start()
+            return
+
+        threading.Thread(target=self.handle_client, args=(
+            client_sock, client_addr)).start()
+
+    def needs_request(self) -> bool:
+        """ Whether server selection looks at the request head (sticky SID or a request-keyed hashing strategy). """
+        return self.opts.sticky_sessions or self.lb_strategy.uses_request
+
+    def read_request_head(self, client_sock: socket.socket) -> HeaderParser:
+        """ Read the client's request head, possibly over several recv calls. Everything read is kept in the parser so it can be replayed to the server. """
+        parser = HeaderParser()
+        try:
+            while True:
+                data = client_sock.recv(BUF_SIZE)
+                # Not HTTP or the client stopped early - lookups fall back to the source IP
+                if not data or parser.feed(data):
+                    return parser
+        except HeaderParseError:
+            return parser
+
+    def handle_client(self, client_sock: socket.socket, client_addr):
+        """ Determine the appropriate server to forward an L4 client connection to using the configured load balancing strategy, then forward it. """
+
+        request = None
+        if self.needs_request():
+            try:
+                request = self.read_request_head(client_sock)
             except Exception as e:
                 self.print_debug(
-                    f"Error receiving initial data from client {client_addr}, closing connection: {e}")
+                    "Error receiving initial data from client %s, closing connection: %s", client_addr, e)
                 client_sock.close()
                 return
-        
-        with self.server_lock:
+
+        server, error_response = self.select_server(client_addr, request)
+        if server is None:
+            self.try_send_error(
+                client_sock, error_response[0], error_response[1])
+            client_sock.close()
+            return
+
+        self.handle_connection(client_sock, client_addr, server, request)
+
+    def select_server(self, client_addr, request: HeaderParser = None, exclude=None):
+        """
+        Decide whether to shed the client and otherwise pick its server (sticky mapping first, then the strategy). Returns the
+        server, or None with the error response to send. Shared by every data plane. A retry passes the servers that already
+        failed as exclude - it was admitted already, so it is neither shed nor counted against the retry budget again.
+        """
+
+        # No global lock: the strategy reads the health checker's immutable snapshot, and counters, the session store and
+        # the shedder each synchronize on their own
+        server = None
+        sid = None
+        if self.opts.sticky_sessions:
+            # If client does not sent SID, use their IP instead for sticky
+            sid = (request.sid if request is not None else None) or client_addr[0]
+
+        if not exclude:
             if self.opts.load_shedding_enabled and self.load_shedder.should_shed():
                 self.print_debug(
-                    f"Shedding load, rejecting connection from {client_addr}")
-                self.try_send_error(
-                    client_sock, SHED_RESPONSE[0], SHED_RESPONSE[1])
-                client_sock.close()
-                return
-
-            # Check if sid is in sticky session mapping
-            if (self.opts.sticky_sessions):
-                (server, last_used) = session_map.get(sid, (None, 0))
-                if (time.time() - last_used >= STICKY_TIMEOUT):
+                    "Shedding load, rejecting connection from %s", client_addr)
+                return None, SHED_RESPONSE
+            self.retry_budget.deposit()
+            if self.opts.hedge_opts.enabled:
+                self.hedge_budget.deposit()
+
+        self.health_check_service.refresh()
+
+        # Check if sid is in sticky session mapping
+        if self.opts.sticky_sessions and not exclude:
+            server = self.session_store.get(sid)
+        if server is None or not server.is_available() or not server.circuit_breaker.allow_request():
+            server = self.lb_strategy.get_server(source_ip=client_addr[0], request=request, exclude=exclude)
+            if server is not None and not server.circuit_breaker.allow_request():
+                # Another thread took its last half-open trial slot - by now the snapshot no longer has it
+                server = self.lb_strategy.get_server(source_ip=client_addr[0], request=request, exclude=(exclude or set()) | {server})
+                if server is not None and not server.circuit_breaker.allow_request():
                     server = None
-            if server is None or not server.is_healthy():
-                server = self.lb_strategy.get_server(source_ip=client_addr[0])
 
-            if server is not None:
-                self.update_connection_count(server, is_connection=True)
-                session_map[sid] = (server, time.time())
-                server.additional_info['active_connections'] = server.additional_info.get(
-                    'active_connections', 0) + 1
-                server.additional_info['errors'] = 0
+        if server is not None:
+            self.update_connection_count(server, is_connection=True)
+            if self.opts.sticky_sessions:
+                self.session_store.put(sid, server)
 
         if server is None:
             self.print_debug(
                 "No healthy servers available, closing client connection")
-            self.try_send_error(
-                client_sock, OVERLOADED_RESPONSE[0], OVERLOADED_RESPONSE[1])
-            client_sock.close()
-            return
-
-        server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        threading.Thread(target=self.handle_connection, args=(
-            client_sock, server_sock, server)).start()
-
-    def handle_connection(self, client_sock: socket.socket, server_sock: socket.socket, server: Server):
-        """ Handle the forwarding of data between client socket and the given server. Creates the server socket connection. """
+            return None, OVERLOADED_RESPONSE
+
+        return server, None
+
+    def connect_server(self, server: Server, client_addr, request: HeaderParser = None):
+        """
+        Get a connection to server from its pool. If connecting fails, pick another server (excluding the ones that failed)
+        and try again, up to max_attempts and while the retry budget lasts. Nothing has been sent yet, so the client cannot
+        tell. Returns (server, socket) - the server actually connected to - or (None, None) once every attempt failed, with
+        every failed server already released.
+        """
+        exclude = set()
+        attempts = self.opts.retry_opts.max_attempts
+        while True:
+            if self.opts.hedge_opts.enabled:
+                connected, server_sock = self.hedged_connect(server, client_addr, request, exclude)
+            else:
+                connected, server_sock = self.try_connect(server, exclude)
+            if server_sock is not None:
+                return connected, server_sock
+
+            attempts -= 1
+            if attempts <= 0 or not self.retry_budget.try_withdraw():
+                return None, None
+            server, _ = self.select_server(client_addr, request, exclude)
+            if server is None:
+                return None, None
+            self.print_debug("Retrying %s on server %s", client_addr, server.name)
+
+    def acquire(self, server: Server) -> socket.socket:
+        """ Pooled connection to server within the per-try connect timeout. Records how long it took for the hedge delay. """
+        start = time.time()
+        server_sock = server.get_additional_info('connection_pool').acquire(self.opts.retry_opts.connect_timeout)
+        self.record_connect_latency(server, time.time() - start)
+        self.report_backend_result(server)
+        return server_sock
+
+    def record_connect_latency(self, server: Server, latency: float):
+        self.connect_latency.record(latency)
+        if self.opts.proxy_mode != "l7":
+            # l4 sees no responses, so the connect time is the only latency the strategy gets
+            self.lb_strategy.record_latency(server, latency)
+
+    def try_connect(self, server: Server, exclude: set):
+        """ One plain connect attempt. Returns (server, socket), or (None, None) with server released and added to exclude. """
+        try:
+            return server, self.acquire(server)
+        except Exception as e:
+            self.connect_failed(server, e)
+            exclude.add(server)
+            return None, None
 
-        # Establish connection to the selected server and if it fails, close client connection and send error
+    def connect_failed(self, server: Server, error: Exception):
+        self.print_debug(
+            "Failed to connect to server %s at %s:%s: %s", server.name, server.ip, server.port, error)
+        self.report_backend_result(server, error)
+        if isinstance(error, PoolExhaustedError):
+            # A full pool is back pressure, not a sign that the server is failing: give the connection slot back without
+            # counting an error or feeding the outlier detector
+            self.update_connection_count(server, is_connection=False)
+        else:
+            self.release_server(server, is_error=True, connect_failed=True)
+
+    def hedged_connect(self, server: Server, client_addr, request: HeaderParser, exclude: set):
+        """
+        Connect to server, and if it has not accepted within the hedge delay (a percentile of recent connect times) also to
+        a second server while the hedge budget lasts. The first connection wins. Nothing has been sent on the loser, so
+        instead of being closed it goes back to its pool once (if) it connects.
+        Returns (server, socket), or (None, None) with every failed server released and added to exclude.
+        """
+        opts = self.opts.hedge_opts
+        attempts = {self.hedge_executor.submit(self.acquire, server): server}
+        done, _ = concurrent.futures.wait(attempts, timeout=self.connect_latency.delay(opts.min_delay, opts.max_delay))
+        if not done and self.hedge_budget.try_withdraw():
+            hedge_server, _ = self.select_server(client_addr, request, exclude | {server})
+            if hedge_server is not None:
+                self.print_debug("Hedging connect for %s to server %s", client_addr, hedge_server.name)
+                attempts[self.hedge_executor.submit(self.acquire, hedge_server)] = hedge_server
+
+        winner = None
+        pending = set(attempts)
+        while pending and winner is None:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    self.connect_failed(attempts[future], future.exception())
+                    exclude.add(attempts[future])
+                elif winner is None:
+                    winner = future
+                else:
+                    self.finish_hedge_loser(attempts[future], future)
+        for future in pending:
+            future.add_done_callback(lambda f, loser=attempts[future]: self.finish_hedge_loser(loser, f))
+
+        if winner is None:
+            return None, None
+        if attempts[winner] is not server:
+            self.hedge_wins.add(1)
+        return attempts[winner], winner.result()
+
+    def finish_hedge_loser(self, server: Server, future: concurrent.futures.Future):
+        if future.exception() is not None:
+            self.connect_failed(server, future.exception())
+            return
+        server.get_additional_info('connection_pool').release(future.result(), reusable=True)
+        # No latency: losers are slow by construction and would bias the outlier detector's latency check
+        self.release_server(server)
+
+    def hedge_request(self, client_addr, request: RequestHead, server: Server, server_sock: socket.socket):
+        """
+        l7 GET/HEAD: if the server sends nothing within the hedge delay (a percentile of recent times to first byte), send
+        the same request to a second server while the hedge budget lasts. Whichever starts responding first is used; the
+        other connection is closed mid-request and its server released. Returns the winning (server, socket).
+        """
+        opts = self.opts.hedge_opts
+        readable, _, _ = select.select([server_sock], [], [], self.ttfb_latency.delay(opts.min_delay, opts.max_delay))
+        if readable or not self.hedge_budget.try_withdraw():
+            return server, server_sock
+
+        hedge_server, _ = self.select_server(client_addr, request.parser, {server})
+        if hedge_server is None:
+            return server, server_sock
+        self.print_debug("Hedging %s %s for %s to server %s", request.method, request.path, client_addr, hedge_server.name)
         try:
-            server_sock.connect((server.ip, server.port))
+            hedge_sock = self.acquire(hedge_server)
         except Exception as e:
+            self.connect_failed(hedge_server, e)
+            return server, server_sock
+        try:
+            hedge_sock.sendall(request.raw)
+        except Exception:
+            hedge_server.get_additional_info('connection_pool').discard(hedge_sock)
+            self.release_server(hedge_server, is_error=True)
+            return server, server_sock
+
+        readable, _, _ = select.select([server_sock, hedge_sock], [], [], TIMEOUT)
+        if hedge_sock in readable and server_sock not in readable:
+            winner, loser = (hedge_server, hedge_sock), (server, server_sock)
+            self.hedge_wins.add(1)
+        else:
+            winner, loser = (server, server_sock), (hedge_server, hedge_sock)
+        loser[0].get_additional_info('connection_pool').discard(loser[1])
+        self.release_server(loser[0])  # no latency, as in finish_hedge_loser
+        return winner
+
+    def handle_connection(self, client_sock: socket.socket, client_addr, server: Server, request: HeaderParser = None):
+        """ Handle the forwarding of data between client socket and the given server. Obtains the server socket connection from the server's pool (failing over to another server if connecting fails) and first replays the request head already read from the client, if any. """
+
+        # Establish connection to the selected server and if it fails everywhere, close client connection and send error
+        server, server_sock = self.connect_server(server, client_addr, request)
+        if server_sock is None:
             self.print_debug(
-                f"Failed to connect to server {server.name} at {server.ip}:{server.port}, closing client connection")
+                "Failed to connect to any server for %s, closing client connection", client_addr)
             self.try_send_error(
                 client_sock, INTERNAL_SERVER_ERROR_RESPONSE[0], INTERNAL_SERVER_ERROR_RESPONSE[1])
             client_sock.close()
-            with self.server_lock:
-                self.update_connection_count(server, is_connection=False)
-                server.additional_info['errors'] += 1
             return
+        pool: ConnectionPool = server.get_additional_info('connection_pool')
 
-        self.print_debug(
-            f"Accepted connection from {client_sock.getpeername()}, forwarding to server {server.name}")
+        if self.logger.enabled(DEBUG):
+            self.print_debug(
+                "Accepted connection from %s, forwarding to server %s", client_sock.getpeername(), server.name)
+
+        forwarder = Forwarder(self.opts.forwarding_mode, BUF_SIZE, TIMEOUT)
+        timer = ExchangeTimer(lambda ttfb, total: self.record_response_time(server, ttfb, total))
+        try:
+            if request is not None and request.buf:
+                server_sock.sendall(request.buf)
+                timer.client_sent()
+            self.forward_loop(client_sock, server_sock, server, forwarder, timer)
+        finally:
+            forwarder.close()
+            # Raw byte passthrough gives no message boundary to stop at, so the connection cannot be reused
+            pool.discard(server_sock)
+            client_sock.close()
+
+    def forward_loop(self, client_sock: socket.socket, server_sock: socket.socket, server: Server, forwarder: Forwarder,
+                     timer: ExchangeTimer = None):
+        """ Pump data in both directions until either side closes, timing the server's responses with timer if given. """
 
         while True:
             try:
@@ -178,54 +637,180 @@ class LoadBalancer(object):
                 
                 # Forward data from client to server and vice versa (depending on which socket is ready)
                 for sock in read_sockets:
-                    data = sock.recv(BUF_SIZE)
-                    self.print_debug(
-                        f"Received {len(data)} bytes from {'client' if sock == client_sock else 'server'}")
-                    if data:
-                        if sock == client_sock:
-                            dest_sock = server_sock
-                        else:
-                            dest_sock = client_sock
-
-                        dest_sock.sendall(data)
+                    if sock == client_sock:
+                        dest_sock = server_sock
                     else:
+                        dest_sock = client_sock
+
+                    moved = forwarder.forward(sock, dest_sock)
+                    if moved is None:
+                        continue
+
+                    self.print_debug(
+                        "Received %s bytes from %s", moved, "client" if sock is client_sock else "server")
+                    if not moved:
                         self.print_debug(
                             "No data received, closing connection")
-                        self.close_connection(sock, server)
+                        if timer is not None:
+                            timer.finish()
+                        self.close_connection(sock, server, latency=timer.mean_ttfb() if timer is not None else None)
                         return
+                    if timer is not None:
+                        if sock is client_sock:
+                            timer.client_sent()
+                        else:
+                            timer.server_sent()
             except Exception as e:
                 self.print_debug(
-                    f"Exception during forwarding: {e}. Closing connection.")
+                    "Exception during forwarding: %s. Closing connection.", e)
                 self.try_send_error(
                     client_sock, INTERNAL_SERVER_ERROR_RESPONSE[0], INTERNAL_SERVER_ERROR_RESPONSE[1])
                 self.close_connection(sock, server, is_error=True)
                 return
 
-    def close_connection(self, sock: socket.socket, server: Server, is_error=False):
+    def handle_http_connection(self, client_sock: socket.socket, client_addr):
+        """ L7 mode: frame every HTTP/1.x request on the client connection and balance each one separately over pooled server connections, keeping the client connection open between requests. """
+
+        client = BufferedSocket(client_sock, BUF_SIZE)
+        try:
+            while True:
+                try:
+                    parser = client.read_head()
+                except socket.timeout:
+                    self.print_debug("Keep-alive connection from %s idle, closing", client_addr)
+                    return
+                if parser is None:
+                    return
+
+                request = RequestHead(parser)
+                server, error_response = self.select_server(client_addr, parser)
+                if server is None:
+                    self.try_send_error(
+                        client_sock, error_response[0], error_response[1])
+                    return
+
+                if not self.proxy_request(client, client_addr, request, server):
+                    return
+        except Exception as e:
+            self.print_debug(
+                "Exception handling requests from %s: %s. Closing connection.", client_addr, e)
+        finally:
+            client_sock.close()
+
+    def proxy_request(self, client: BufferedSocket, client_addr, request: RequestHead, server: Server) -> bool:
+        """ Send one request to the server on a pooled connection (failing over to another server if connecting fails) and relay the response. Returns whether the client connection may carry another request. """
+
+        server, server_sock = self.connect_server(server, client_addr, request.parser)
+        if server_sock is None:
+            self.try_send_error(
+                client.sock, INTERNAL_SERVER_ERROR_RESPONSE[0], INTERNAL_SERVER_ERROR_RESPONSE[1])
+            return False
+        pool: ConnectionPool = server.get_additional_info('connection_pool')
+
+        self.print_debug(
+            "Forwarding %s %s to server %s", request.method, request.path, server.name)
+
+        response_started = False
+        reusable = False
+        is_error = False
+        latency = None
+        try:
+            start = time.time()
+            if request.expects_continue():
+                # The body is forwarded before anything is read from the server, so its 100 Continue could not be relayed
+                # in time - answer the expectation here and drop it from what the server sees
+                server_sock.sendall(request.without_header("expect"))
+                client.sock.sendall(CONTINUE_RESPONSE)
+            else:
+                server_sock.sendall(request.raw)
+            client.forward_body(server_sock, request.body_length())
+            if self.opts.hedge_opts.enabled and request.method in self.opts.hedge_opts.methods and request.body_length() == 0:
+                server, server_sock = self.hedge_request(client_addr, request, server, server_sock)
+                pool = server.get_additional_info('connection_pool')
+
+            # Relay interim (1xx) responses until the final one
+            backend = BufferedSocket(server_sock, BUF_SIZE)
+            while True:
+                parser = backend.read_head()
+                if parser is None:
+                    raise HTTPFramingError("Server closed the connection without responding")
+                response = ResponseHead(parser)
+                if latency is None:
+                    latency = time.time() - start  # time to the first response head
+                    self.ttfb_latency.record(latency)
+                    self.report_backend_result(server)
+                response_started = True
+                client.sock.sendall(response.raw)
+                if not response.is_interim():
+                    break
+
+            body_length = response.body_length(request.method)
+            backend.forward_body(client.sock, body_length)
+            self.record_response_time(server, latency, time.time() - start)
+
+            # The request head is forwarded as is, so the server also closes when the client asked it to
+            reusable = request.keep_alive() and response.reusable(request.method) and not backend.buf
+            return request.keep_alive() and response.keep_alive() and body_length != UNTIL_CLOSE
+        except Exception as e:
+            is_error = True
+            if isinstance(e, socket.timeout) and not response_started:
+                self.report_backend_result(server, e)
+            self.print_debug(
+                "Exception proxying request to server %s: %s", server.name, e)
+            if not response_started:
+                self.try_send_error(
+                    client.sock, INTERNAL_SERVER_ERROR_RESPONSE[0], INTERNAL_SERVER_ERROR_RESPONSE[1])
+            return False
+        finally:
+            pool.release(server_sock, reusable)
+            self.release_server(server, is_error, latency)
+
+    def record_response_time(self, server: Server, ttfb: float, total: float):
+        """ Feed a proxied request's times into the server's live response time estimate. Per server and lock-free. """
+        server.get_additional_info('response_time').record(ttfb, total)
+
+    def report_backend_result(self, server: Server, error: Exception = None):
+        """ Feed the server's circuit breaker: reaching the server worked (error None), connecting failed / timed out, or the pool was full (no verdict). """
+        if error is None:
+            server.circuit_breaker.record_success()
+        elif isinstance(error, PoolExhaustedError):
+            # Says nothing about the server, but a half-open trial slot it held must be given back
+            server.circuit_breaker.release_trial()
+        else:
+            server.circuit_breaker.record_failure()
+
+    def close_connection(self, sock: socket.socket, server: Server, is_error=False, latency=None):
         """ Close the client or server socket and update connection counts. """
         sock.close()
-        with self.server_lock:
-            self.update_connection_count(server, is_connection=False)
+        self.release_server(server, is_error, latency)
 
-            if is_error:
-                server.additional_info['errors'] += 1
+    def release_server(self, server: Server, is_error=False, latency=None, connect_failed=False):
+        """ Update connection counts once a proxied connection (or request) is finished and report its outcome to the outlier detector. """
+        self.update_connection_count(server, is_connection=False)
 
-            self.print_debug(
-                f"Closed connection for server {server.name} who has active connections: {server.additional_info.get('active_connections', 0)}")
+        if is_error:
+            server.errors.add(1)
+        elif latency is not None and self.opts.proxy_mode == "l7":
+            # l4 strategies already got the connect time, which is known as soon as the connection starts
+            self.lb_strategy.record_latency(server, latency)
+        self.outlier_detector.record(server, not is_error, latency, connect_failed)
+
+        self.print_debug(
+            "Closed connection for server %s who has active connections: %s", server.name, server.get_active_connections())
 
     def update_connection_count(self, server: Server, is_connection: bool):
         """ Update the active connection count for the server and the load shedder. """
 
         if is_connection:
-            server.additional_info['active_connections'] = server.additional_info.get(
-                'active_connections', 0) + 1
+            server.add_active_connections(1)
             self.load_shedder.increment_connections()
 
         else:
-            server.additional_info['active_connections'] = server.additional_info.get(
-                'active_connections', 0) - 1
+            server.add_active_connections(-1)
             self.load_shedder.decrement_connections()
 
+        self.lb_strategy.connection_count_changed(server)
+
     def try_send_error(self, client_sock: socket.socket, status_code: int, msg: str):
         """ Attempt to send an HTTP error response to the client. """
         try:
@@ -233,4 +818,4 @@ class LoadBalancer(object):
                 status_code, msg).get_response_string()
             client_sock.sendall(http_response.encode())
         except Exception as e:
-            self.print_debug(f"Error sending {status_code} response: {e}")
+            self.print_debug("Error sending %s response: %s", status_code, e)
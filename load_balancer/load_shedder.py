@@ -10,10 +10,28 @@ class LoadShedParams:
         self.strategy = strategy
         
 class LoadShedder:
-    def __init__(self, opts:LoadShedParams=LoadShedParams()):
+    def __init__(self, opts:LoadShedParams=LoadShedParams(), shared_connections=None):
         self.opts = opts
-        self.simultaneous_connections = 0
         self.conn_lock = threading.Lock()
+        self._simultaneous_connections = 0
+
+        # multiprocessing.Value shared by pre-forked workers so shedding sees the connections of every worker
+        self.shared_connections = shared_connections
+        if self.shared_connections is not None:
+            self.conn_lock = self.shared_connections.get_lock()
+
+    @property
+    def simultaneous_connections(self):
+        if self.shared_connections is not None:
+            return self.shared_connections.value
+        return self._simultaneous_connections
+
+    @simultaneous_connections.setter
+    def simultaneous_connections(self, value):
+        if self.shared_connections is not None:
+            self.shared_connections.value = value
+        else:
+            self._simultaneous_connections = value
 
     def should_shed(self):
         if self.opts.strategy == "exponential":
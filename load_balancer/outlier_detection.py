@@ -0,0 +1,184 @@
+import collections
+import math
+import statistics
+import threading
+import time
+import typing
+from serv_obj import Server
+from lb_logger import INFO, WARNING
+
+
+class OutlierOpts:
+    def __init__(self,
+                 enabled=True,
+                 consecutive_failures=3,
+                 window=10,
+                 error_rate=0.5,
+                 min_requests=10,
+                 latency_factor=3.0,
+                 base_ejection_time=5,
+                 max_ejection_time=60,
+                 max_ejection_percent=50):
+        self.enabled = enabled
+        self.consecutive_failures = consecutive_failures  # connect failures in a row that eject a server, 0 to disable
+        self.window = window  # seconds of traffic the error rate and latency are computed over
+        self.error_rate = error_rate  # failed fraction of the window that ejects a server, 0 to disable
+        self.min_requests = min_requests  # requests a server needs in the window before its error rate / latency are judged
+        self.latency_factor = latency_factor  # eject when mean latency exceeds this multiple of the peer median, 0 to disable
+        self.base_ejection_time = base_ejection_time  # seconds, doubled for every ejection in a row
+        self.max_ejection_time = max_ejection_time
+        self.max_ejection_percent = max_ejection_percent  # at most this share of servers ejected at once (always at least one)
+
+
+class OutlierStats:
+    """ Sliding window of one server's request outcomes plus its ejection history. """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = collections.deque()  # (time, ok, latency or None), oldest on the left
+        self.failures = 0  # failed results in the window
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.consecutive_failures = 0
+        self.ejections = 0  # ejections in a row, sets the next ejection time
+        self.uneject_time = 0.0
+
+    def add(self, now: float, ok: bool, latency):
+        self.results.append((now, ok, latency))
+        if not ok:
+            self.failures += 1
+        if latency is not None:
+            self.latency_sum += latency
+            self.latency_count += 1
+
+    def trim(self, cutoff: float):
+        while self.results and self.results[0][0] < cutoff:
+            _, ok, latency = self.results.popleft()
+            if not ok:
+                self.failures -= 1
+            if latency is not None:
+                self.latency_sum -= latency
+                self.latency_count -= 1
+
+    def clear(self):
+        self.results.clear()
+        self.failures = 0
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.consecutive_failures = 0
+
+    def mean_latency(self):
+        return self.latency_sum / self.latency_count if self.latency_count else None
+
+
+class OutlierDetector:
+    """
+    Passive health checking from live traffic. Every finished connection (or request in l7 mode) is recorded per server;
+    a server is ejected - kept out of selection while active probes may still call it healthy - after a run of connect
+    failures, a high error rate over the window, or a mean latency far above its peers'. Ejections last base_ejection_time
+    doubled for each consecutive ejection, and no more than max_ejection_percent of the servers are ejected at once.
+    """
+
+    def __init__(self, servers: typing.List[Server], opts: OutlierOpts = OutlierOpts(), on_change: typing.Callable[[], None] = None,
+                 logger=None):
+        self.servers = servers
+        self.opts = opts
+        self.on_change = on_change  # called after a server is ejected or returned, e.g. to republish the healthy snapshot
+        self.logger = logger  # AsyncLogger for ejections and returns
+        self.stats = {server.name: OutlierStats() for server in servers}
+        self.ejection_lock = threading.Lock()
+        self.total_ejections = 0
+
+    def add_server(self, server: Server):
+        self.stats[server.name] = OutlierStats()  # fresh, even if a server by that name was removed before
+
+    def remove_server(self, server: Server):
+        """ Forget server's results, so they no longer count towards its peers' latency median. """
+        self.stats.pop(server.name, None)
+
+    def record(self, server: Server, ok: bool, latency=None, connect_failed=False):
+        """ Record one result for server: whether it succeeded, its latency if measured, and whether connecting failed. """
+        if not self.opts.enabled:
+            return
+
+        stats = self.stats.get(server.name)
+        if stats is None:
+            return  # removed while the connection was open
+        now = time.time()
+        with stats.lock:
+            stats.add(now, ok, latency)
+            stats.trim(now - self.opts.window)
+            if connect_failed:
+                stats.consecutive_failures += 1
+            elif ok:
+                stats.consecutive_failures = 0
+
+            reason = self.ejection_reason(server, stats)
+
+        if reason is not None:
+            self.eject(server, stats, reason)
+
+    def ejection_reason(self, server: Server, stats: OutlierStats):
+        if server.ejected:
+            return None
+        if self.opts.consecutive_failures and stats.consecutive_failures >= self.opts.consecutive_failures:
+            return f"{stats.consecutive_failures} consecutive connect failures"
+
+        requests = len(stats.results)
+        if requests < self.opts.min_requests:
+            return None
+        if self.opts.error_rate and stats.failures / requests >= self.opts.error_rate:
+            return f"error rate {stats.failures / requests:.0%} over the last {self.opts.window}s"
+
+        if self.opts.latency_factor and stats.latency_count >= self.opts.min_requests:
+            peer_latencies = [peer.mean_latency() for name, peer in self.stats.items()
+                              if name != server.name and peer.latency_count >= self.opts.min_requests]
+            if peer_latencies:
+                median = statistics.median(peer_latencies)
+                latency = stats.mean_latency()
+                if median > 0 and latency > self.opts.latency_factor * median:
+                    return f"mean latency {latency * 1000:.1f}ms vs peer median {median * 1000:.1f}ms"
+        return None
+
+    def eject(self, server: Server, stats: OutlierStats, reason: str):
+        with self.ejection_lock:
+            ejected = sum(1 for s in self.servers if s.ejected)
+            limit = max(1, math.floor(len(self.servers) * self.opts.max_ejection_percent / 100))
+            if server.ejected or ejected >= limit:
+                return
+
+            # A server that stayed in long enough since its last ejection starts over at the base time
+            if time.time() - stats.uneject_time > self.opts.max_ejection_time:
+                stats.ejections = 0
+            stats.ejections += 1
+            duration = min(self.opts.max_ejection_time, self.opts.base_ejection_time * 2 ** (stats.ejections - 1))
+            server.ejected = True
+            self.total_ejections += 1
+
+        self.log(WARNING, "Ejecting %s for %ss: %s", server.name, duration, reason)
+        timer = threading.Timer(duration, self.uneject, args=(server,))
+        timer.daemon = True
+        timer.start()
+        if self.on_change is not None:
+            self.on_change()
+
+    def uneject(self, server: Server):
+        stats = self.stats.get(server.name)
+        if stats is not None and server in self.servers:  # not removed (and possibly re-added) meanwhile
+            with stats.lock:
+                stats.clear()  # judge it on fresh traffic
+                stats.uneject_time = time.time()
+        server.ejected = False
+        self.log(INFO, "Returning %s to rotation", server.name)
+        if self.on_change is not None:
+            self.on_change()
+
+    def log(self, level: int, msg: str, *args):
+        if self.logger is not None:
+            self.logger.log(level, msg, *args)
+
+    def stats_summary(self) -> dict:
+        return {
+            "total_ejections": self.total_ejections,
+            "ejected": [server.name for server in self.servers if server.ejected],
+        }
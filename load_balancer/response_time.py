@@ -0,0 +1,89 @@
+import math
+import time
+import typing
+
+DECAY_TIME = 2.0  # seconds of traffic the response time averages mostly reflect
+LONG_DECAY_TIME = 60.0  # same for the long-run average an idle server's estimate settles back to
+
+
+class ResponseTimeEWMA:
+    """
+    Time-decayed averages of one backend's time to first byte and total response time, measured on live requests. Each
+    sample's weight grows with the time since the previous one, so the averages cover about the last decay_time seconds
+    whatever the request rate. A second total average over long_decay_time is what the estimate settles back to while no
+    samples arrive: a server avoided after a burst of slow responses is tried again once its recent average has decayed
+    to its usual level, while one that is always slow stays avoided.
+    No lock: the state is one tuple replaced whole, so a reader always sees a consistent one and racing writers can at
+    most lose a sample.
+    """
+
+    def __init__(self, decay_time=DECAY_TIME, long_decay_time=LONG_DECAY_TIME):
+        self.decay_time = decay_time
+        self.long_decay_time = long_decay_time
+        self.state = None  # (ttfb, total, long-run total, time of the last sample), None until the first sample
+
+    def record(self, ttfb: float, total: float):
+        now = time.monotonic()
+        state = self.state
+        if state is None:
+            self.state = (ttfb, total, total, now)
+            return
+        weight = math.exp(-(now - state[3]) / self.decay_time)
+        long_weight = math.exp(-(now - state[3]) / self.long_decay_time)
+        self.state = (state[0] * weight + ttfb * (1 - weight), state[1] * weight + total * (1 - weight),
+                      state[2] * long_weight + total * (1 - long_weight), now)
+
+    def has_samples(self) -> bool:
+        return self.state is not None
+
+    def total(self) -> float:
+        """ The total response time average, decaying towards the long-run one while no samples arrive. None without samples. """
+        state = self.state
+        if state is None:
+            return None
+        weight = math.exp(-(time.monotonic() - state[3]) / self.decay_time)
+        return state[1] * weight + state[2] * (1 - weight)
+
+    def ttfb(self) -> float:
+        state = self.state
+        return None if state is None else state[0]
+
+
+class ExchangeTimer:
+    """
+    Response times on an l4 connection, which carries bytes rather than requests. An exchange starts with the first client
+    bytes after the previous response, its first byte is the first server bytes after that, and it ends with the last
+    server bytes before the client sends again or the connection closes.
+    """
+
+    def __init__(self, on_exchange: typing.Callable[[float, float], None]):
+        self.on_exchange = on_exchange  # called with (ttfb, total) for every answered exchange
+        self.start = self.first_byte = self.last_byte = None
+        self.exchanges = 0
+        self.ttfb_sum = 0.0
+
+    def client_sent(self):
+        if self.first_byte is not None:
+            self.finish()
+        if self.start is None:
+            self.start = time.monotonic()
+
+    def server_sent(self):
+        if self.start is not None:
+            now = time.monotonic()
+            if self.first_byte is None:
+                self.first_byte = now
+            self.last_byte = now
+
+    def finish(self):
+        """ Report the exchange in progress if the server answered it. """
+        if self.first_byte is not None:
+            ttfb = self.first_byte - self.start
+            self.exchanges += 1
+            self.ttfb_sum += ttfb
+            self.on_exchange(ttfb, self.last_byte - self.start)
+        self.start = self.first_byte = self.last_byte = None
+
+    def mean_ttfb(self) -> float:
+        """ Mean time to first byte over the connection's answered exchanges, None if there were none. """
+        return self.ttfb_sum / self.exchanges if self.exchanges else None
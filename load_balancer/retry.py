@@ -0,0 +1,44 @@
+import threading
+
+
+class RetryOpts:
+    def __init__(self, max_attempts=3, connect_timeout=1.0, budget=0.2, min_retries=10):
+        self.max_attempts = max_attempts  # connect attempts per client connection / request, including the first
+        self.connect_timeout = connect_timeout  # seconds per connect attempt, independent of the socket default timeout
+        self.budget = budget  # retries allowed as a fraction of requests, so a sick fleet is not hit with a multiple of the load
+        self.min_retries = min_retries  # retries always available, so low traffic can still fail over
+
+
+class RetryBudget:
+    """
+    Token bucket shared by all connections: every request deposits `ratio` tokens and every retry (or hedge) withdraws one,
+    so they stay below that fraction of traffic. The bucket holds at most min_tokens + ratio * 100 tokens and starts with
+    min_tokens.
+    """
+
+    def __init__(self, ratio=0.2, min_tokens=10):
+        self.ratio = ratio
+        self.capacity = min_tokens + ratio * 100
+        self.tokens = float(min_tokens)
+        self.lock = threading.Lock()
+
+        self.spent = 0
+        self.exhausted = 0
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        """ Take a token for one retry or hedge. False when the budget is spent. """
+        with self.lock:
+            if self.tokens < 1:
+                self.exhausted += 1
+                return False
+            self.tokens -= 1
+            self.spent += 1
+            return True
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"tokens": round(self.tokens, 1), "spent": self.spent, "exhausted": self.exhausted}
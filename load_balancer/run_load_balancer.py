@@ -1,30 +1,10 @@
+import signal
 import sys
-from strategies.lb_strategy import LBStrategy
-from strategies.round_robin_strategy import RoundRobinStrategy
-from strategies.consistent_hash_strategy import ConsistentHashing
-from strategies.weighted_round_robin_strategy import WeightedRoundRobinStrategy
-from strategies.least_connections_strategy import LeastConnectionsStrategy
-from strategies.least_response_time_strategy import LeastResponseTimeStrategy
-from load_balancer import LoadBalancer, LBOpts
-from load_shedder import LoadShedParams
-from serv_obj import Server
-import json
-import typing
-
-
-def get_strategy(strategy_name: str, servers: typing.List[Server], *, replica_count=100) -> LBStrategy:
-    if strategy_name == "round_robin":
-        return RoundRobinStrategy(servers)
-    elif strategy_name == "hash":
-        return ConsistentHashing(servers, replica_count)
-    elif strategy_name == "weighted_round_robin":
-        return WeightedRoundRobinStrategy(servers)
-    elif strategy_name == "least_connections":
-        return LeastConnectionsStrategy(servers)
-    elif strategy_name == "least_response_time":
-        return LeastResponseTimeStrategy(servers)
-    else:
-        return None
+from load_balancer import LoadBalancer
+from async_load_balancer import AsyncLoadBalancer
+from admin import AdminServer
+from config import ConfigError, ConfigReloader, load_config
+from workers import WorkerPool
 
 
 if __name__ == "__main__":
@@ -36,37 +16,24 @@ if __name__ == "__main__":
         print("Usage: python run_load_balancer.py <path_to_config>.json")
         sys.exit(1)
 
-    with open(sys.argv[1], 'r') as f:
-        config = json.load(f)
-
-        servers = []
-        for serv in config["servers"]:
-            server = Server(serv["name"], serv["ip"], serv["port"])
-            # Set weight if specified in config
-            if "weight" in serv:
-                server.set_additional_info("weight", serv["weight"])
-            servers.append(server)
+    try:
+        config = load_config(sys.argv[1])
+    except ConfigError as e:
+        print(e)
+        sys.exit(1)
 
-        lb_strategy = get_strategy(config.get("strategy", "round_robin"), servers)
-        if lb_strategy is None:
-            print(f"Unknown strategy: {config.get('strategy')}")
-            sys.exit(1)
-        
-        lb_opts = LBOpts(
-            sticky_sessions=config.get("sticky_sessions", False),
-            debug_mode=config.get("debug_mode", False),
-            health_check_interval=config.get("health_check_interval", 3),
-            health_check_path=config.get("health_check_path", "/health"),
-            health_check_timeout=config.get("health_check_timeout", 2),
-            load_shedding_enabled=config.get("load_shedding_enabled", False),
-            load_shed_params=LoadShedParams(
-                sim_conn_threshold=config.get("load_shed_params", {}).get("sim_conn_threshold", 5),
-                strategy=config.get("load_shed_params", {}).get("strategy", "exponential")
-            )
-        )
+    servers = config.build_servers()
+    lb_opts = config.lb_opts
+    lb_class = AsyncLoadBalancer if lb_opts.data_plane == "asyncio" else LoadBalancer
 
-        lb = LoadBalancer(config["load_balancer_ip"], config["load_balancer_port"], servers, lb_strategy, lb_opts)
+    if lb_opts.workers > 1:
+        signal.signal(signal.SIGHUP, lambda signum, frame: print("[LB] Config reload is not supported with workers > 1"))
+        WorkerPool(config.ip, config.port, servers, config.strategy_factory(), lb_opts, lb_class).start()
+    else:
+        lb = lb_class(config.ip, config.port, servers, config.strategy_factory()(servers), lb_opts)
+        # kill -HUP <pid> re-reads the config file and applies it without dropping connections
+        reloader = ConfigReloader(lb, sys.argv[1], config)
+        signal.signal(signal.SIGHUP, reloader.on_signal)
+        if config.admin_opts.enabled:
+            AdminServer(lb, config.admin_opts, reloader).start()
         lb.start_lb()
-
-
-    
\ No newline at end of file
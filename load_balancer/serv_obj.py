@@ -1,3 +1,26 @@
+import threading
+
+
+class AtomicCounter:
+    """ Integer counter whose updates are atomic. Each counter has its own lock so that updates to different servers never contend. """
+
+    def __init__(self, value=0):
+        self._value = value
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def add(self, delta: int) -> int:
+        with self._lock:
+            self._value += delta
+            return self._value
+
+    def set(self, value: int):
+        self._value = value
+
+
 class Server:
     """ Representation of a server object with health status and additional information. """
 
@@ -5,9 +28,43 @@ class Server:
         self.name = name
         self.ip = ip
         self.port = port
-        self.healthy = healthy
         self.additional_info = {}
 
+        self.active_connections = AtomicCounter()
+        self.errors = AtomicCounter()  # connections (requests in l7 mode) that ended in an error
+
+        # Set by the outlier detector while the server is kept out of selection because of errors seen in live traffic
+        self.ejected = False
+
+        # Set through the admin API: no new connections, the ones already open finish normally
+        self.draining = False
+
+        # CircuitBreaker attached by the LB
+        self.circuit_breaker = None
+
+        # Set when running as a pre-forked worker - health and connection counts then live in shared memory
+        self.shared_state = None
+        self.shared_index = None
+
+        self.healthy = healthy
+
+    def attach_shared_state(self, shared_state, index):
+        self.shared_state = shared_state
+        self.shared_index = index
+
+    @property
+    def healthy(self) -> bool:
+        if self.shared_state is not None:
+            return self.shared_state.healthy[self.shared_index]
+        return self._healthy
+
+    @healthy.setter
+    def healthy(self, status: bool):
+        if self.shared_state is not None:
+            self.shared_state.healthy[self.shared_index] = status
+        else:
+            self._healthy = status
+
     def set_additional_info(self, key, info):
         self.additional_info[key] = info
 
@@ -18,4 +75,22 @@ class Server:
         self.healthy = status
 
     def is_healthy(self) -> bool:
-        return self.healthy
\ No newline at end of file
+        return self.healthy
+
+    def is_available(self) -> bool:
+        """ Whether the server may be selected: healthy according to active checks, not ejected by passive ones, not draining and its circuit breaker not open. """
+        return (self.healthy and not self.ejected and not self.draining
+                and (self.circuit_breaker is None or self.circuit_breaker.selectable()))
+
+    def get_active_connections(self) -> int:
+        if self.shared_state is not None:
+            return self.shared_state.active_connections[self.shared_index].value
+        return self.active_connections.value
+
+    def add_active_connections(self, delta: int):
+        if self.shared_state is not None:
+            counter = self.shared_state.active_connections[self.shared_index]
+            with counter.get_lock():
+                counter.value += delta
+        else:
+            self.active_connections.add(delta)
@@ -0,0 +1,67 @@
+import collections
+import threading
+import time
+from serv_obj import Server
+
+
+class SessionStore:
+    """
+    Bounded sticky session map from SID to server. Entries are kept in last-used order, which is both the LRU order and the
+    expiry order (every use refreshes the timeout), so expired sessions are dropped from the front in O(1) each and a full
+    store evicts its least recently used session.
+    """
+
+    def __init__(self, ttl=5, max_size=100000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.sessions: "collections.OrderedDict[str, tuple]" = collections.OrderedDict()  # sid -> (server, last used)
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(self, sid) -> Server:
+        """ Server the session is stuck to, or None if unknown or expired. """
+        now = time.time()
+        with self.lock:
+            self._expire(now)
+            entry = self.sessions.get(sid)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def put(self, sid, server: Server):
+        """ Stick the session to server and refresh its timeout. """
+        now = time.time()
+        with self.lock:
+            self.sessions[sid] = (server, now)
+            self.sessions.move_to_end(sid)
+            self._expire(now)
+            while len(self.sessions) > self.max_size:
+                self.sessions.popitem(last=False)
+                self.evictions += 1
+
+    def _expire(self, now: float):
+        cutoff = now - self.ttl
+        while self.sessions:
+            sid, (_, last_used) = next(iter(self.sessions.items()))
+            if last_used > cutoff:
+                return
+            del self.sessions[sid]
+            self.expirations += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.sessions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+            }
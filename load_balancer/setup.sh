@@ -18,4 +18,5 @@ apt update && apt install -y \
     openvswitch-switch openvswitch-testcontroller
 
 pip3 install --upgrade pip
-pip3 install matplotlib
\ No newline at end of file
+pip3 install matplotlib
+pip3 install numpy  # optional, vectorizes the rendezvous strategy
\ No newline at end of file
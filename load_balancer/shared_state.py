@@ -0,0 +1,98 @@
+import ctypes
+import hashlib
+import multiprocessing
+import time
+import typing
+from serv_obj import Server
+
+SESSION_SLOTS = 65536
+SESSION_PROBES = 8  # how many neighbouring slots a session may land in before the oldest one is overwritten
+
+
+class SharedSessionTable:
+    """
+    Fixed-size sticky session table in shared memory with the same get/put interface as SessionStore. Stores a 64-bit SID
+    hash, the server index and the last used time per slot so every worker sees the same mapping; the fixed size bounds it,
+    and an expired slot is simply free for reuse.
+    """
+
+    # Indexes into the shared counters array
+    HITS, MISSES, EVICTIONS = range(3)
+
+    def __init__(self, slots=SESSION_SLOTS, ttl=5):
+        self.slots = slots
+        self.ttl = ttl
+        self.lock = multiprocessing.Lock()
+        self.keys = multiprocessing.RawArray(ctypes.c_uint64, slots)  # 0 marks an empty slot
+        self.server_index = multiprocessing.RawArray(ctypes.c_int32, slots)
+        self.last_used = multiprocessing.RawArray(ctypes.c_double, slots)
+        self.counters = multiprocessing.RawArray(ctypes.c_long, 3)
+        self.servers: typing.List[Server] = []
+
+    def _hash(self, sid) -> int:
+        key = int.from_bytes(hashlib.blake2b(str(sid).encode(), digest_size=8).digest(), "little")
+        return key or 1
+
+    def get(self, sid) -> Server:
+        key = self._hash(sid)
+        start = key % self.slots
+        cutoff = time.time() - self.ttl
+        with self.lock:
+            for i in range(SESSION_PROBES):
+                slot = (start + i) % self.slots
+                if self.keys[slot] == key and self.last_used[slot] > cutoff:
+                    self.counters[self.HITS] += 1
+                    return self.servers[self.server_index[slot]]
+            self.counters[self.MISSES] += 1
+        return None
+
+    def put(self, sid, server: Server):
+        key = self._hash(sid)
+        start = key % self.slots
+        now = time.time()
+        with self.lock:
+            # Reuse the SID's own slot, else the least recently used slot in the probe window (empty and expired slots sort first)
+            target = None
+            for i in range(SESSION_PROBES):
+                slot = (start + i) % self.slots
+                if self.keys[slot] == key:
+                    target = slot
+                    break
+                if target is None or self.last_used[slot] < self.last_used[target]:
+                    target = slot
+            if self.keys[target] not in (0, key) and self.last_used[target] > now - self.ttl:
+                self.counters[self.EVICTIONS] += 1
+            self.keys[target] = key
+            self.server_index[target] = server.shared_index
+            self.last_used[target] = now
+
+    def stats(self) -> dict:
+        with self.lock:
+            hits, misses, evictions = self.counters
+        lookups = hits + misses
+        return {
+            "slots": self.slots,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": evictions,
+        }
+
+
+class SharedBackendState:
+    """ Backend state kept in shared memory so that pre-forked workers balance, shed and stick on global rather than per-worker numbers. """
+
+    def __init__(self, num_servers, session_slots=SESSION_SLOTS, session_ttl=5):
+        # One Value (with its own lock) per server so that updates to different servers do not contend
+        self.active_connections = [multiprocessing.Value(ctypes.c_long, 0) for _ in range(num_servers)]
+        self.healthy = multiprocessing.Array(ctypes.c_bool, [True] * num_servers)
+        self.health_version = multiprocessing.Value(ctypes.c_long, 0)  # bumped by the health checker on every status change
+        self.total_connections = multiprocessing.Value(ctypes.c_long, 0)
+        self.sessions = SharedSessionTable(session_slots, session_ttl)
+
+    def attach(self, servers: typing.List[Server]):
+        """ Back each server's health flag and connection count with its slot in shared memory. Must run before forking. """
+        for index, server in enumerate(servers):
+            self.healthy[index] = server.healthy
+            server.attach_shared_state(self, index)
+        self.sessions.servers = servers
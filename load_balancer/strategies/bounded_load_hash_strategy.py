@@ -0,0 +1,73 @@
+from strategies.consistent_hash_strategy import ConsistentHashing
+from serv_obj import Server
+from http_parser import get_affinity_key
+import math
+import threading
+import typing
+
+
+class BoundedLoadHashing(ConsistentHashing):
+    """
+    Consistent hashing with bounded loads (Mirrokni et al., 2018). No server may hold more than
+    ceil((1 + balance_factor) * average in-flight connections) - counting the one being placed - so a lookup walks the ring
+    clockwise past servers that are full. Keys keep their server while it has room, and a hot key spills onto the next
+    servers on the ring rather than anywhere.
+    The total in-flight count is kept current through connection_count_changed; in worker mode, where other processes
+    change the shared counts, it is summed per lookup instead.
+    """
+
+    def __init__(self, servers: typing.List[Server], replica_count=100, hash_key="source_ip", balance_factor=0.25):
+        super().__init__(servers, replica_count, hash_key)
+        self.balance_factor = balance_factor
+        self.count_lock = threading.Lock()
+        self.counts = {}  # server -> connection count last seen by connection_count_changed
+        self.total_connections = 0
+        for server in servers:
+            self.connection_count_changed(server)  # non-zero when built by a config reload
+
+    def connection_count_changed(self, server: Server):
+        with self.count_lock:
+            count = server.get_active_connections()
+            self.total_connections += count - self.counts.get(server, 0)
+            self.counts[server] = count
+
+    def remove_server(self, server: Server):
+        super().remove_server(server)
+        with self.count_lock:
+            self.total_connections -= self.counts.pop(server, 0)
+
+    def capacity(self, healthy) -> int:
+        if self.servers and self.servers[0].shared_state is not None:
+            total = sum(s.get_active_connections() for s in healthy)
+        else:
+            total = self.total_connections
+        return math.ceil((1 + self.balance_factor) * (total + 1) / len(healthy))
+
+    def get_server(self, **kwargs):
+        ring = self.ring
+        if (not ring.hashes or "source_ip" not in kwargs or not
+                kwargs.get("source_ip")):
+            return None
+        healthy = self.healthy_servers
+        if not healthy:
+            return None
+
+        key = get_affinity_key(self.hash_key, kwargs.get("source_ip"), kwargs.get("request"))
+        next_available = ring.next_available
+        position = next_available[ring.position(key)]
+        if position < 0:
+            return None
+
+        exclude = kwargs.get("exclude") or ()
+        capacity = self.capacity(healthy)
+        size = len(next_available)
+        fallback = None
+        for _ in range(size):
+            server = ring.server_at(position)
+            if server not in exclude and self.selectable(server):
+                if server.get_active_connections() < capacity:
+                    return server
+                fallback = fallback or server
+            position = next_available[(position + 1) % size]
+        # Counts moved under us and every server looks full: plain consistent hashing
+        return fallback
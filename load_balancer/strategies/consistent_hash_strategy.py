@@ -1,53 +1,170 @@
 from strategies.lb_strategy import LBStrategy
 from serv_obj import Server
+from http_parser import get_affinity_key
 import typing
-import hashlib
+import array
 import bisect
+import functools
+import heapq
+import threading
+import zlib
+
+# NumPy is optional: with it the next-available index is built in a few vectorized passes, without it in a Python loop
+try:
+    import numpy
+except ImportError:
+    numpy = None
+NUMPY_AVAILABLE = numpy is not None
+
+MASK64 = (1 << 64) - 1
+LOOKUP_CACHE_SIZE = 65536  # hot keys whose ring position is remembered
+
+
+def hash64(key: str) -> int:
+    """ Fast non-cryptographic 64-bit hash: crc32 and adler32 of the key, mixed by the murmur3 finalizer so every bit spreads. """
+    data = key.encode()
+    h = zlib.crc32(data) << 32 | zlib.adler32(data)
+    h ^= h >> 33
+    h = h * 0xff51afd7ed558ccd & MASK64
+    h ^= h >> 33
+    h = h * 0xc4ceb9fe1a85ec53 & MASK64
+    return h ^ h >> 33
+
+
+class HashRing:
+    """
+    Immutable ring: sorted 64-bit replica hashes, the index (into servers) of each replica's owner, and for every position
+    the next one owned by an available server. Changes build a new ring that is swapped in whole, so a lookup never sees
+    a half-updated one.
+    """
+
+    def __init__(self, hashes: array.array, owners: array.array, servers: list, healthy_servers, position=None):
+        self.hashes = hashes
+        self.owners = owners
+        self.servers = servers  # owners index into this list
+        # Key -> ring position only depends on the hashes, so the cache is shared by rings that differ only in health
+        self.position = position or functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._position)
+        self.next_available = self._index_available(healthy_servers)
+
+    def with_healthy(self, healthy_servers) -> "HashRing":
+        return HashRing(self.hashes, self.owners, self.servers, healthy_servers, self.position)
+
+    def _index_available(self, healthy_servers) -> array.array:
+        """ next_available[i]: first ring position at or after i (wrapping) owned by an available server, -1 if none is. """
+        size = len(self.hashes)
+        healthy = set(healthy_servers)
+        available = [server in healthy for server in self.servers]
+        if NUMPY_AVAILABLE and size:
+            return self._index_available_numpy(available)
+        owners = self.owners
+        next_available = array.array('i', [-1]) * size
+        following = -1
+        # Two sweeps from the end: the first finds what wraps around past the last position, the second fills in
+        for _ in range(2):
+            for i in range(size - 1, -1, -1):
+                if available[owners[i]]:
+                    following = i
+                next_available[i] = following
+        return next_available
+
+    def _index_available_numpy(self, available: list) -> array.array:
+        size = len(self.hashes)
+        owned = numpy.array(available, dtype=bool)[numpy.asarray(self.owners)]
+        # Available positions stand for themselves and the rest for "none up to the end", so a running minimum from the
+        # end gives every position the next available one; the positions past the last available one wrap to the first
+        positions = numpy.where(owned, numpy.arange(size, dtype=numpy.int32), numpy.int32(size))
+        following = numpy.minimum.accumulate(positions[::-1])[::-1]
+        first = following[0]
+        following[following == size] = first if first < size else -1
+        return array.array('i', following.astype(numpy.int32).tobytes())
+
+    def _position(self, key: str) -> int:
+        position = bisect.bisect_left(self.hashes, hash64(key))
+        return 0 if position == len(self.hashes) else position
+
+    def server_at(self, position: int) -> Server:
+        return self.servers[self.owners[position]]
 
 
 class ConsistentHashing(LBStrategy):
     """
-    Source IP hashing using hash ring to prevent remapping when servers change
+    Source IP hashing using hash ring to prevent remapping when servers change.
+    hash_key can instead hash a request attribute: "sid", "host", "path", "cookie" or "cookie:<name>" (source IP when absent).
+    The ring is a sorted array of 64-bit replica hashes with the owning server index alongside, built with one sort. Every
+    health snapshot precomputes, for each ring position, the next position owned by an available server (vectorized with
+    NumPy when available), so a lookup is a (cached) bisect plus one index read however many unhealthy replicas follow it. Adding or removing a server merges or
+    filters only that server's replicas.
     """
 
-    def __init__(self, servers: typing.List[Server], replica_count=100):
+    def __init__(self, servers: typing.List[Server], replica_count=100, hash_key="source_ip"):
         super().__init__(servers)
-        self.hash_ring = dict()
-        self.sorted_hash = []
+        self.hash_key = hash_key
+        self.uses_request = hash_key != "source_ip"
         self.replica_count = replica_count
-        for server in servers:
-            # print(server.ip)
-            self._hash_server(server)
+        replicas = sorted(
+            (h, index)
+            for index, server in enumerate(servers)
+            for h in self._replica_hashes(server)
+        )
+        self.ring_lock = threading.Lock()  # writers only: health snapshots and server changes each derive a new ring
+        self.ring = HashRing(array.array('Q', (h for h, _ in replicas)), array.array('I', (index for _, index in replicas)),
+                             list(servers), self.healthy_servers)
+
+    def _replica_hashes(self, server: Server):
+        return [self._hash(f"{server.ip}replica{i}") for i in range(self.replica_count)]
+
+    def update_healthy(self, healthy_servers):
+        with self.ring_lock:
+            self.ring = self.ring.with_healthy(healthy_servers)
+            super().update_healthy(healthy_servers)
 
-    def _hash_server(self, server: Server):
-        for i in range(self.replica_count):
-            replica_hash = self._hash(f"{server.ip}replica{i}")
-            self.hash_ring[replica_hash] = server
-            bisect.insort(self.sorted_hash, replica_hash)
+    def add_server(self, server: Server):
+        hashes = sorted(self._replica_hashes(server))
+        with self.ring_lock:
+            ring = self.ring
+            index = len(ring.servers)
+            merged = list(heapq.merge(zip(ring.hashes, ring.owners), ((h, index) for h in hashes)))
+            self.ring = HashRing(array.array('Q', (h for h, _ in merged)), array.array('I', (i for _, i in merged)),
+                                 ring.servers + [server], self.healthy_servers)
+
+    def remove_server(self, server: Server):
+        with self.ring_lock:
+            ring = self.ring
+            if server not in ring.servers:
+                return
+            index = ring.servers.index(server)
+            # Drop its replicas and its list entry, shifting the owner indexes after it down so the list never grows
+            kept = [(h, i - (i > index)) for h, i in zip(ring.hashes, ring.owners) if i != index]
+            self.ring = HashRing(array.array('Q', (h for h, _ in kept)), array.array('I', (i for _, i in kept)),
+                                 ring.servers[:index] + ring.servers[index + 1:], self.healthy_servers)
 
     def get_server(self, **kwargs):
-        if (not self.sorted_hash or "source_ip" not in kwargs or not
+        ring = self.ring
+        if (not ring.hashes or "source_ip" not in kwargs or not
                 kwargs.get("source_ip")):
             return None
 
-        source_ip = kwargs.get("source_ip")
-        source_hash = self._hash(source_ip)
-        closest_server = bisect.bisect_left(self.sorted_hash, source_hash)
-
-        if closest_server == len(self.sorted_hash):
-            closest_server = 0
-
-        for i in range(len(self.sorted_hash)):
-            server_hash = self.sorted_hash[(
-                closest_server + i) % len(self.sorted_hash)]
-            server = self.hash_ring[server_hash]
+        key = get_affinity_key(self.hash_key, kwargs.get("source_ip"), kwargs.get("request"))
+        next_available = ring.next_available
+        position = next_available[ring.position(key)]
+        if position < 0:
+            return None
+        server = ring.server_at(position)
 
-            if server.healthy:
+        exclude = kwargs.get("exclude")
+        if not exclude and self.selectable(server):
+            return server
+        # Retry hint, or the server's half-open trial slots are taken: keep walking available replicas past it
+        exclude = exclude or ()
+        size = len(next_available)
+        for _ in range(size):
+            if server not in exclude and self.selectable(server):
                 return server
-
+            position = next_available[(position + 1) % size]
+            server = ring.server_at(position)
         return None
 
     def _hash(self, key):
         if key is None:
             return None
-        return abs(int(hashlib.md5(bytes(key, "UTF-8")).hexdigest(), 16))
+        return hash64(key)
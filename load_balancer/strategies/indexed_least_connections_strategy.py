@@ -0,0 +1,112 @@
+from strategies.least_connections_strategy import LeastConnectionsStrategy
+from serv_obj import Server
+import threading
+import typing
+
+
+class IndexedLeastConnectionsStrategy(LeastConnectionsStrategy):
+    """
+    Least connections backed by an indexed min-heap of the healthy servers, keyed on (active connections / weight, position
+    in the server list) - the same key and tie-break as LeastConnectionsStrategy's scan, so both pick the same server.
+    The data plane calls connection_count_changed after every count change (O(log n)) and health snapshots add or remove
+    servers, so get_server reads the root in O(1).
+    Counts changed by other worker processes never reach the heap, so with shared state (and for exclude hints, which only
+    retries pass) it falls back to the scan.
+    """
+
+    def __init__(self, servers: typing.List[Server]):
+        super().__init__(servers)
+        self.lock = threading.Lock()
+        self.order = {server: i for i, server in enumerate(servers)}
+        self.heap = []  # servers, heap ordered on keys
+        self.keys = {}  # server -> (load, order) it is stored under
+        self.positions = {}  # server -> index in heap
+        for server in self.healthy_servers:
+            self._insert(server)
+
+    def update_healthy(self, healthy_servers):
+        with self.lock:
+            healthy = set(healthy_servers)
+            for server in [s for s in self.heap if s not in healthy]:
+                self._remove(server)
+            for server in healthy_servers:
+                if server not in self.positions:
+                    self._insert(server)
+            self.healthy_servers = healthy_servers
+
+    def connection_count_changed(self, server: Server):
+        with self.lock:
+            index = self.positions.get(server)
+            if index is None:
+                return
+            key = self._key(server)
+            old_key = self.keys[server]
+            self.keys[server] = key
+            if key < old_key:
+                self._sift_up(index)
+            elif key > old_key:
+                self._sift_down(index)
+
+    def server_weight_changed(self, server: Server):
+        self.connection_count_changed(server)  # the key is connections / weight
+
+    def get_server(self, **kwargs):
+        if kwargs.get("exclude") or (self.servers and self.servers[0].shared_state is not None):
+            return super().get_server(**kwargs)
+        with self.lock:
+            server = self.heap[0] if self.heap else None
+        if server is None or self.selectable(server):
+            return server
+        return super().get_server(**kwargs)  # the root's half-open trial slots are taken
+
+    def _key(self, server: Server):
+        order = self.order.get(server)
+        if order is None:
+            order = self.order.setdefault(server, len(self.order))
+        return server.get_active_connections() / server.additional_info.get('weight', 1), order
+
+    # Heap primitives, callers hold the lock
+
+    def _insert(self, server: Server):
+        self.keys[server] = self._key(server)
+        self.heap.append(server)
+        self.positions[server] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+
+    def _remove(self, server: Server):
+        index = self.positions.pop(server)
+        del self.keys[server]
+        last = self.heap.pop()
+        if index < len(self.heap):
+            self.heap[index] = last
+            self.positions[last] = index
+            self._sift_up(index)
+            self._sift_down(self.positions[last])
+
+    def _swap(self, i: int, j: int):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.positions[heap[i]] = i
+        self.positions[heap[j]] = j
+
+    def _sift_up(self, index: int):
+        keys, heap = self.keys, self.heap
+        while index > 0:
+            parent = (index - 1) // 2
+            if keys[heap[index]] >= keys[heap[parent]]:
+                break
+            self._swap(index, parent)
+            index = parent
+
+    def _sift_down(self, index: int):
+        keys, heap = self.keys, self.heap
+        size = len(heap)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and keys[heap[child]] < keys[heap[smallest]]:
+                    smallest = child
+            if smallest == index:
+                return
+            self._swap(index, smallest)
+            index = smallest
@@ -1,8 +1,47 @@
 class LBStrategy:
     """ Base class for load balancing strategies. """
 
+    # Strategies that route on the request head (not just source_ip) set this so the data plane parses it before get_server
+    uses_request = False
+
     def __init__(self, servers):
         self.servers = servers
+        # Immutable snapshot of the healthy servers, replaced (never mutated) by update_healthy so get_server needs no lock
+        self.healthy_servers = tuple(s for s in servers if s.is_available())
+
+    def update_healthy(self, healthy_servers):
+        """ Called with the new healthy server tuple whenever the health checker publishes one. """
+        self.healthy_servers = healthy_servers
+
+    def available(self, exclude=None):
+        """ The healthy snapshot without the servers in exclude (get_server's exclude hint, e.g. servers that just failed to connect). """
+        if not exclude:
+            return self.healthy_servers
+        return tuple(s for s in self.healthy_servers if s not in exclude)
+
+    @staticmethod
+    def selectable(server) -> bool:
+        """
+        Whether server's circuit breaker lets a request through. Half-open trial slots fill up and free far too often to
+        republish the snapshot each time, so get_server checks the server it settles on.
+        """
+        breaker = server.circuit_breaker
+        return breaker is None or breaker.selectable()
+
+    def add_server(self, server):
+        """ Called when server joins the fleet at runtime, before the snapshot that includes it is published. """
+
+    def remove_server(self, server):
+        """ Called when server leaves the fleet at runtime. Connections still open to it finish normally. """
+
+    def server_weight_changed(self, server):
+        """ Called after server's weight in additional_info was changed at runtime. """
+
+    def record_latency(self, server, latency):
+        """ Called by the data plane with each latency it measures for server. Strategies that do not use it ignore it. """
+
+    def connection_count_changed(self, server):
+        """ Called by the data plane right after server's active connection count changed. """
 
     def get_server(self, **kwargs):
         raise NotImplementedError("This method should be overridden by subclasses")
\ No newline at end of file
@@ -13,7 +13,7 @@ class LeastConnectionsStrategy(LBStrategy):
 
     def get_server(self, **kwargs):
         return min(
-            [s for s in self.servers if s.healthy],
-            key=lambda s: s.additional_info.get('active_connections', 0) / s.additional_info.get('weight', 1),
+            (s for s in self.available(kwargs.get("exclude")) if self.selectable(s)),
+            key=lambda s: s.get_active_connections() / s.additional_info.get('weight', 1),
             default=None
         )
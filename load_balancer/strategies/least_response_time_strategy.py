@@ -4,19 +4,25 @@ import typing
 
 class LeastResponseTimeStrategy(LBStrategy):
     """
-    Select a healthy server with the lowest average response time.
+    Select a healthy server with the lowest response time: the decaying average of the total response time of live
+    requests (measured by the data plane). The health probe RTT is only used for a server with no samples at all - /health
+    is far cheaper than real requests, so the two are not mixed. See ResponseTimeEWMA for how an idle server is retried.
     Use weight from additional_info if available (default to 1 otherwise).
     """
 
     def __init__(self, servers: typing.List[Server]):
         super().__init__(servers)
 
+    def response_time(self, server: Server) -> float:
+        estimate = server.get_additional_info('response_time')
+        if estimate is not None and estimate.has_samples():
+            return estimate.total()
+        health_check_info = server.get_additional_info('health_check_info')
+        return health_check_info.get_average_rtt() if health_check_info else float('inf')
+
     def get_server(self, **kwargs):
         return min(
-            [s for s in self.servers if s.healthy],
-            key=lambda s: (
-                s.get_additional_info('health_check_info').get_average_rtt() 
-                if s.get_additional_info('health_check_info') else float('inf')
-            ) / s.additional_info.get('weight', 1),
+            (s for s in self.available(kwargs.get("exclude")) if self.selectable(s)),
+            key=lambda s: self.response_time(s) / s.additional_info.get('weight', 1),
             default=None
         )
@@ -0,0 +1,125 @@
+from strategies.lb_strategy import LBStrategy
+from strategies.consistent_hash_strategy import hash64
+from serv_obj import Server
+from http_parser import get_affinity_key
+import typing
+import array
+import threading
+
+MAGLEV_TABLE_SIZE = 65537  # prime, and much larger than the number of servers for even shares
+FALLBACK_PROBES = 8  # next table slots tried when a key's own slot belongs to a server that cannot take it
+
+
+class MaglevTable:
+    """ Immutable Maglev lookup table: entry i is the index into servers that owns slot i. """
+
+    def __init__(self, servers: tuple, entries: array.array):
+        self.servers = servers
+        self.entries = entries
+
+
+class MaglevHashing(LBStrategy):
+    """
+    Maglev hashing (Eisenbud et al., NSDI 2016). Every available server walks its own permutation of a prime-sized table
+    and the servers take turns claiming their next free slot until the table is full, so each owns an almost equal share
+    and a server joining or leaving mostly moves only its own slots. A lookup is one hash and one table read.
+    Health changes rebuild the table on a background thread while the old table keeps serving (snapshots listing the same
+    servers as the table are skipped). Keys that land on a server the old table still lists but that is no longer
+    available (or is excluded) try the next few slots, then the key's pick among the current snapshot's servers.
+    hash_key works as for ConsistentHashing.
+    """
+
+    def __init__(self, servers: typing.List[Server], table_size=MAGLEV_TABLE_SIZE, hash_key="source_ip"):
+        super().__init__(servers)
+        self.table_size = table_size
+        self.hash_key = hash_key
+        self.uses_request = hash_key != "source_ip"
+        self.permutations = {}  # server -> (offset, skip), kept across rebuilds
+
+        self.rebuild_lock = threading.Lock()
+        self.rebuild_pending = False
+        self.rebuilding = False
+        self.rebuilds = 0
+        self.table = self._populate(self.healthy_servers)
+
+    def update_healthy(self, healthy_servers):
+        super().update_healthy(healthy_servers)
+        with self.rebuild_lock:
+            if not self.rebuilding and healthy_servers == self.table.servers:
+                return  # e.g. a breaker state change that did not change what is available
+            self.rebuild_pending = True
+            if self.rebuilding:
+                return  # the running rebuild picks up the newest snapshot when it finishes
+            self.rebuilding = True
+        if not self.table.servers:
+            self._rebuild()  # no old table to keep serving, so rebuild right here
+        else:
+            threading.Thread(target=self._rebuild, name="maglev-rebuild", daemon=True).start()
+
+    def remove_server(self, server: Server):
+        self.permutations.pop(server, None)
+
+    def _rebuild(self):
+        while True:
+            with self.rebuild_lock:
+                if not self.rebuild_pending:
+                    self.rebuilding = False
+                    return
+                self.rebuild_pending = False
+            healthy_servers = self.healthy_servers
+            if healthy_servers != self.table.servers:
+                self.table = self._populate(healthy_servers)
+                self.rebuilds += 1
+
+    def _permutation(self, server: Server):
+        permutation = self.permutations.get(server)
+        if permutation is None:
+            key = f"{server.ip}:{server.port}"
+            offset = hash64(key) % self.table_size
+            skip = hash64(key + "#skip") % (self.table_size - 1) + 1
+            permutation = self.permutations.setdefault(server, (offset, skip))
+        return permutation
+
+    def _populate(self, servers: tuple) -> MaglevTable:
+        size = self.table_size
+        entries = array.array('i', [-1]) * size
+        if not servers:
+            return MaglevTable(servers, entries)
+
+        permutations = [self._permutation(server) for server in servers]
+        slots = [offset for offset, _ in permutations]  # next candidate slot of each server
+        filled = 0
+        while True:
+            for i, (_, skip) in enumerate(permutations):
+                slot = slots[i]
+                while entries[slot] >= 0:
+                    slot = (slot + skip) % size
+                entries[slot] = i
+                slots[i] = (slot + skip) % size
+                filled += 1
+                if filled == size:
+                    return MaglevTable(servers, entries)
+
+    def get_server(self, **kwargs):
+        if "source_ip" not in kwargs or not kwargs.get("source_ip"):
+            return None
+
+        table = self.table
+        if not table.servers:
+            return None
+        key = get_affinity_key(self.hash_key, kwargs.get("source_ip"), kwargs.get("request"))
+        key_hash = hash64(key)
+        slot = key_hash % self.table_size
+        server = table.servers[table.entries[slot]]
+
+        exclude = kwargs.get("exclude") or ()
+        if server.is_available() and server not in exclude:
+            return server
+        # Stale table (rebuild in flight) or a retry: a few next slots, which spread the key over the other servers
+        for i in range(1, FALLBACK_PROBES + 1):
+            server = table.servers[table.entries[(slot + i) % self.table_size]]
+            if server.is_available() and server not in exclude:
+                return server
+        # All of those are unusable too: the key's pick among the current snapshot's servers that can take it
+        candidates = [s for s in self.available(exclude) if self.selectable(s)]
+        return candidates[key_hash % len(candidates)] if candidates else None
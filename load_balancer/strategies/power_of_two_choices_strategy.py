@@ -0,0 +1,80 @@
+from strategies.lb_strategy import LBStrategy
+from serv_obj import Server
+import math
+import random
+import time
+import typing
+
+UNMEASURED_PENALTY = 1e6  # cost per in-flight request of a server with no latency sample yet
+
+
+class PeakEWMA:
+    """
+    Latency average that jumps straight up to a slower sample and decays back down over decay_time seconds, so a server
+    that just got slow is avoided at once but has to stay fast for a while to win back its traffic.
+    """
+
+    def __init__(self, decay_time=10.0, initial=0.0):
+        self.decay_time = decay_time
+        self.value = initial
+        self.stamp = time.monotonic()
+
+    def observe(self, latency: float):
+        # Unlocked read-modify-write: a sample lost to a concurrent one only makes the average slightly staler
+        now = time.monotonic()
+        if latency > self.value:
+            self.value = latency
+        else:
+            weight = math.exp(-(now - self.stamp) / self.decay_time)
+            self.value = self.value * weight + latency * (1 - weight)
+        self.stamp = now
+
+
+class PowerOfTwoChoicesStrategy(LBStrategy):
+    """
+    Pick two healthy servers at random and select the cheaper one, where the cost is the peak EWMA latency times the
+    requests in flight (plus one, so idle servers still compare by latency), divided by the weight if set.
+    Selection is O(1) in the number of servers, and since the random pairs differ, concurrent selections do not all pile
+    onto the single server that looked best at the last update. Latency samples come from the data plane through
+    record_latency: time to the response head in l7 mode, connect time in l4 mode.
+    """
+
+    def __init__(self, servers: typing.List[Server], decay_time=10.0):
+        super().__init__(servers)
+        self.decay_time = decay_time
+        self.latencies = {server: PeakEWMA(decay_time) for server in servers}
+
+    def record_latency(self, server: Server, latency: float):
+        ewma = self.latencies.get(server)
+        if ewma is None:
+            ewma = self.latencies.setdefault(server, PeakEWMA(self.decay_time))
+        ewma.observe(latency)
+
+    def remove_server(self, server: Server):
+        self.latencies.pop(server, None)
+
+    def cost(self, server: Server) -> float:
+        ewma = self.latencies.get(server)
+        in_flight = server.get_active_connections()
+        if ewma is None or ewma.value == 0:
+            # No sample yet: free while idle, so it gets traffic to measure, and avoided once that traffic is pending
+            return UNMEASURED_PENALTY * in_flight
+        return ewma.value * (in_flight + 1) / server.additional_info.get('weight', 1)
+
+    def get_server(self, **kwargs):
+        healthy = self.available(kwargs.get("exclude"))
+        if len(healthy) < 2:
+            return healthy[0] if healthy and self.selectable(healthy[0]) else None
+
+        first = random.randrange(len(healthy))
+        second = random.randrange(len(healthy) - 1)
+        if second >= first:
+            second += 1
+        a, b = healthy[first], healthy[second]
+        a_selectable, b_selectable = self.selectable(a), self.selectable(b)
+        if a_selectable and b_selectable:
+            return a if self.cost(a) <= self.cost(b) else b
+        if a_selectable or b_selectable:
+            return a if a_selectable else b
+        # Both have their half-open trial slots taken: any server that can take the request
+        return next((s for s in healthy if self.selectable(s)), None)
@@ -0,0 +1,125 @@
+from strategies.lb_strategy import LBStrategy
+from strategies.consistent_hash_strategy import hash64, MASK64
+from serv_obj import Server
+from http_parser import get_affinity_key
+import typing
+import functools
+import math
+
+# NumPy is optional: with it a lookup scores every server in one vectorized pass, without it in a Python loop
+try:
+    import numpy
+except ImportError:
+    numpy = None
+NUMPY_AVAILABLE = numpy is not None
+
+LOOKUP_CACHE_SIZE = 4096  # hot keys whose server is remembered until the next health snapshot
+BULK_CHUNK = 64  # keys scored per matrix in get_servers
+C1 = 0xff51afd7ed558ccd
+C2 = 0xc4ceb9fe1a85ec53
+
+
+def mix64(h: int) -> int:
+    """ murmur3 64-bit finalizer, the same mixing as hash64. """
+    h ^= h >> 33
+    h = h * C1 & MASK64
+    h ^= h >> 33
+    h = h * C2 & MASK64
+    return h ^ h >> 33
+
+
+class RendezvousView:
+    """ One health snapshot prepared for scoring: the servers, their seeds and weights, and the lookup cache for it. """
+
+    def __init__(self, servers: tuple):
+        self.servers = servers
+        self.seeds = [hash64(f"{s.ip}:{s.port}") for s in servers]
+        self.weights = [s.additional_info.get('weight', 1) for s in servers]
+        self.weighted = any(w != 1 for w in self.weights)
+        if NUMPY_AVAILABLE:
+            self.seed_array = numpy.array(self.seeds, dtype=numpy.uint64)
+            self.weight_array = numpy.array(self.weights, dtype=numpy.float64)
+
+
+class RendezvousHashing(LBStrategy):
+    """
+    Rendezvous (highest random weight) hashing: every server scores the key with hash(key, server) and the highest score
+    wins, weighted as -weight / ln(score in (0, 1)) so each server gets its weight's share of keys. Losing a server only
+    moves the keys it had, and there is no ring to store - memory is one seed per server.
+    hash_key works as for ConsistentHashing (source IP, SID, cookie, path or Host from the parsed request). Each health
+    snapshot gets a fresh LRU cache of key -> server in front of the O(n) scoring pass.
+    """
+
+    def __init__(self, servers: typing.List[Server], hash_key="source_ip"):
+        super().__init__(servers)
+        self.hash_key = hash_key
+        self.uses_request = hash_key != "source_ip"
+        self._set_view(self.healthy_servers)
+
+    def update_healthy(self, healthy_servers):
+        self._set_view(healthy_servers)
+        super().update_healthy(healthy_servers)
+
+    def server_weight_changed(self, server: Server):
+        self._set_view(self.healthy_servers)
+
+    def _set_view(self, healthy_servers):
+        view = RendezvousView(healthy_servers)
+        lookup = functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)(lambda key: self._best(view, hash64(key)))
+        self.view, self.lookup = view, lookup
+
+    def get_server(self, **kwargs):
+        if "source_ip" not in kwargs or not kwargs.get("source_ip"):
+            return None
+        key = get_affinity_key(self.hash_key, kwargs.get("source_ip"), kwargs.get("request"))
+        exclude = kwargs.get("exclude")
+        view = self.view
+        server = self._best(view, hash64(key), exclude) if exclude else self.lookup(key)
+        if server is None or self.selectable(server):
+            return server
+        # Its half-open trial slots are taken: the best server that can take the request
+        unselectable = {s for s in view.servers if not self.selectable(s)}
+        return self._best(view, hash64(key), unselectable.union(exclude or ()))
+
+    def get_servers(self, keys: typing.List[str]) -> list:
+        """ Bulk lookup of affinity keys, scored as one keys x servers matrix when NumPy is available. """
+        view = self.view
+        if not view.servers:
+            return [None] * len(keys)
+        if not NUMPY_AVAILABLE:
+            return [self._best(view, hash64(key)) for key in keys]
+        key_hashes = numpy.array([hash64(key) for key in keys], dtype=numpy.uint64)
+        servers = []
+        # Chunks keep the keys x servers matrix in cache - one matrix for thousands of keys is several times slower per key
+        for start in range(0, len(keys), BULK_CHUNK):
+            scores = self._scores(view, key_hashes[start:start + BULK_CHUNK, None] ^ view.seed_array[None, :])
+            servers.extend(view.servers[i] for i in scores.argmax(axis=1))
+        return servers
+
+    def _best(self, view: RendezvousView, key_hash: int, exclude=None):
+        if NUMPY_AVAILABLE and view.servers and not exclude:
+            scores = self._scores(view, view.seed_array ^ numpy.uint64(key_hash))
+            return view.servers[int(scores.argmax())]
+
+        # Without NumPy, and for retries with an exclude hint
+        best, best_score = None, -1
+        for server, seed, weight in zip(view.servers, view.seeds, view.weights):
+            if exclude and server in exclude:
+                continue
+            h = mix64(key_hash ^ seed)
+            score = -weight / math.log((h >> 11) * 2.0 ** -53 + 2.0 ** -54) if view.weighted else h
+            if score > best_score:
+                best, best_score = server, score
+        return best
+
+    def _scores(self, view: RendezvousView, h):
+        """ Vectorized mix64 over an array of key ^ seed values, then the weighted score if any weight differs. """
+        h = h ^ (h >> numpy.uint64(33))
+        h = h * numpy.uint64(C1)
+        h = h ^ (h >> numpy.uint64(33))
+        h = h * numpy.uint64(C2)
+        h = h ^ (h >> numpy.uint64(33))
+        if not view.weighted:
+            return h
+        uniform = (h >> numpy.uint64(11)).astype(numpy.float64) * 2.0 ** -53 + 2.0 ** -54
+        return -view.weight_array / numpy.log(uniform)
@@ -1,24 +1,23 @@
 from strategies.lb_strategy import LBStrategy
 from serv_obj import Server
+import itertools
 import typing
 
 class RoundRobinStrategy(LBStrategy):
     """ Load balancing strategy that selects servers in a round-robin, skipping unhealthy servers. """
 
     def __init__(self, servers: typing.List[Server]):
-        self.servers = servers
-        self.current_index = 0
+        super().__init__(servers)
+        # next() on a count is atomic, so concurrent callers each get their own turn without a lock
+        self.turns = itertools.count()
 
     def get_server(self, **kwargs):
-        if not self.servers:
-            return None
-        
-        starting_index = self.current_index
-        while self.servers[self.current_index].healthy is False:
-            self.current_index = (self.current_index + 1) % len(self.servers)
-            if self.current_index == starting_index:
-                return None  # All servers are unhealthy
-        
-        selected_server = self.servers[self.current_index]
-        self.current_index = (self.current_index + 1) % len(self.servers)
-        return selected_server
\ No newline at end of file
+        healthy = self.available(kwargs.get("exclude"))
+        if not healthy:
+            return None  # All servers are unhealthy
+        turn = next(self.turns)
+        for i in range(len(healthy)):
+            server = healthy[(turn + i) % len(healthy)]
+            if self.selectable(server):
+                return server
+        return None
\ No newline at end of file
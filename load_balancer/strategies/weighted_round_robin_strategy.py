@@ -1,32 +1,43 @@
 from strategies.lb_strategy import LBStrategy
 from serv_obj import Server
+import threading
 import typing
 
 
 class WeightedRoundRobinStrategy(LBStrategy):
     """
-    Round robin algorithm that gives more turns to servers with higher weight.
-    Use weight from additional_info if available(default to 1 otherwise).
+    Smooth weighted round robin (as in nginx): every pick adds each healthy server's weight to its current weight, selects
+    the server with the highest current weight and subtracts the total weight from it. Over sum(weights) picks every server
+    gets exactly its weight in turns, spread out rather than in runs - weights 5, 1, 1 give a a b a c a a.
+    Memory is one counter per server, and weights are read on every pick, so a weight changed at runtime takes effect immediately.
+    Use weight from additional_info if available (default to 1 otherwise).
     """
 
     def __init__(self, servers: typing.List[Server]):
         super().__init__(servers)
-        self.current_index = 0
-        self.weighted_list = []
+        self.lock = threading.Lock()
+        self.current_weights = {}  # server -> current weight
 
-        for s in servers:
-            weight = s.additional_info.get('weight', 1)
-            self.weighted_list.extend([s] * weight)
+    def remove_server(self, server: Server):
+        with self.lock:
+            self.current_weights.pop(server, None)
 
     def get_server(self, **kwargs):
-        if not self.weighted_list:
-            return None
-
-        for _ in range(len(self.weighted_list)):
-            server = self.weighted_list[self.current_index % len(self.weighted_list)]
-            self.current_index = (self.current_index + 1) % len(self.weighted_list)
-
-            if server.healthy:
-                return server
-
-        return None
+        healthy = self.available(kwargs.get("exclude"))
+        with self.lock:
+            current_weights = self.current_weights
+            best = None
+            best_weight = 0
+            total = 0
+            for s in healthy:
+                weight = s.additional_info.get('weight', 1)
+                if weight <= 0 or not self.selectable(s):
+                    continue
+                current = current_weights.get(s, 0) + weight
+                current_weights[s] = current
+                total += weight
+                if best is None or current > best_weight:
+                    best, best_weight = s, current
+            if best is not None:
+                current_weights[best] = best_weight - total
+            return best
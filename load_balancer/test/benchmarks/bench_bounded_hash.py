@@ -0,0 +1,70 @@
+import heapq
+import random
+import sys
+from serv_obj import Server
+from strategies.consistent_hash_strategy import ConsistentHashing
+from strategies.bounded_load_hash_strategy import BoundedLoadHashing
+
+# Bounded-load consistent hashing on skewed traffic, simulated without sockets. Run from the load_balancer directory:
+#   python3 -m test.benchmarks.bench_bounded_hash [num_servers]
+# Source IPs are Zipf distributed, so a few heavy clients dominate. Every connection is counted the way
+# LoadBalancer.update_connection_count does and lasts an exponential number of steps. "max/mean" is the busiest server's
+# in-flight connections over the average, averaged over the run; "affinity" is the fraction of connections that went
+# to the server plain consistent hashing picks for their IP.
+
+NUM_SERVERS = 20
+CLIENTS = 10000
+ZIPF_S = 1.1
+CONNECTIONS = 100000
+MEAN_LIFETIME = 400  # steps, so about MEAN_LIFETIME connections are in flight
+BALANCE_FACTORS = [0.1, 0.25, 0.5, 1.0]
+
+
+def zipf_clients(rng: random.Random):
+    weights = [1 / (rank ** ZIPF_S) for rank in range(1, CLIENTS + 1)]
+    ips = [f"172.16.{i // 256}.{i % 256}" for i in range(CLIENTS)]
+    return rng.choices(ips, weights, k=CONNECTIONS)
+
+
+def simulate(strategy, servers, clients, home: dict, rng: random.Random):
+    departures = []  # (step, server)
+    ratio_sum = 0.0
+    samples = 0
+    at_home = 0
+    for step, ip in enumerate(clients):
+        while departures and departures[0][0] <= step:
+            _, index = heapq.heappop(departures)
+            servers[index].add_active_connections(-1)
+            strategy.connection_count_changed(servers[index])
+
+        server = strategy.get_server(source_ip=ip)
+        server.add_active_connections(1)
+        strategy.connection_count_changed(server)
+        at_home += server is home[ip]
+        heapq.heappush(departures, (step + 1 + int(rng.expovariate(1 / MEAN_LIFETIME)), servers.index(server)))
+
+        if step >= MEAN_LIFETIME * 2:
+            loads = [s.get_active_connections() for s in servers]
+            ratio_sum += max(loads) / (sum(loads) / len(loads))
+            samples += 1
+    return ratio_sum / samples, at_home / len(clients)
+
+
+def bench(num_servers: int, balance_factor):
+    rng = random.Random(1)
+    servers = [Server(f"s{i}", f"10.0.{i // 256}.{i % 256}", 80) for i in range(num_servers)]
+    clients = zipf_clients(rng)
+    plain = ConsistentHashing(servers)
+    home = {ip: plain.get_server(source_ip=ip) for ip in set(clients)}
+    strategy = plain if balance_factor is None else BoundedLoadHashing(servers, balance_factor=balance_factor)
+    return simulate(strategy, servers, clients, home, rng)
+
+
+if __name__ == "__main__":
+    num_servers = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_SERVERS
+
+    print(f"\n--- Bounded-Load Hashing ({num_servers} servers, {CLIENTS} Zipf({ZIPF_S}) clients, ~{MEAN_LIFETIME} in flight) ---")
+    for balance_factor in [None] + BALANCE_FACTORS:
+        ratio, affinity = bench(num_servers, balance_factor)
+        name = "hash" if balance_factor is None else f"bounded_hash e={balance_factor}"
+        print(f"{name:<22} max/mean {ratio:5.2f}   affinity {affinity:.1%}")
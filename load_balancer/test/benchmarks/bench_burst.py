@@ -0,0 +1,92 @@
+import select
+import socket
+import threading
+import time
+from load_balancer import LoadBalancer, LBOpts
+from strategies.round_robin_strategy import RoundRobinStrategy
+from test.benchmarks.bench_helper import LB_IP, LB_PORT, start_backends, start_process, stop_processes, wait_for_port
+
+# Connection establishment latency while a burst of clients connects at once. Run from the load_balancer directory:
+#   sudo python3 -m test.benchmarks.bench_burst
+# "before" is the old listener (backlog 5, one accept per select wakeup), "after" the batched accept loop.
+
+BURSTS = 5
+BURST_SIZE = 500
+
+
+class SingleAcceptLoadBalancer(LoadBalancer):
+    """ The accept loop as it was before batching: blocking select.select and a single accept per wakeup. """
+
+    def start_lb(self):
+        while True:
+            read_sockets, _, _ = select.select([self.lb_socket], [], [])
+            for sock in read_sockets:
+                try:
+                    client_sock, client_addr = sock.accept()
+                except BlockingIOError:
+                    continue
+                self.accept_connection(client_sock, client_addr)
+
+
+def run_lb(servers, lb_class, backlog):
+    opts = LBOpts(health_check_interval=3600, listen_backlog=backlog)
+    lb_class(LB_IP, LB_PORT, servers, RoundRobinStrategy(servers), opts).start_lb()
+
+
+def client(barrier: threading.Barrier, connect_times: list, response_times: list):
+    barrier.wait()
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((LB_IP, LB_PORT), timeout=10) as sock:
+            connected = time.perf_counter()
+            sock.sendall(f"GET / HTTP/1.0\r\nHost: {LB_IP}\r\n\r\n".encode())
+            # The first response byte is the point where the LB has accepted, picked a server and relayed its answer
+            if sock.recv(1):
+                connect_times.append(connected - start)
+                response_times.append(time.perf_counter() - start)
+    except OSError:
+        pass
+
+
+def measure_bursts():
+    connect_times, response_times = [], []
+    for _ in range(BURSTS):
+        barrier = threading.Barrier(BURST_SIZE)
+        threads = [threading.Thread(target=client, args=(barrier, connect_times, response_times)) for _ in range(BURST_SIZE)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        time.sleep(0.5)
+    return connect_times, response_times
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else float("nan")
+
+
+def bench_burst():
+    backends, servers = start_backends()
+    results = {}
+    try:
+        for name, lb_class, backlog in [("before", SingleAcceptLoadBalancer, 5), ("after", LoadBalancer, LBOpts().listen_backlog)]:
+            lb = start_process(run_lb, servers, lb_class, backlog)
+            try:
+                wait_for_port(LB_IP, LB_PORT)
+                results[name] = measure_bursts()
+            finally:
+                stop_processes([lb])
+    finally:
+        stop_processes(backends)
+    return results
+
+
+if __name__ == "__main__":
+    results = bench_burst()
+
+    print(f"\n--- Burst Connection Latency ({BURSTS} bursts of {BURST_SIZE} clients, ms) ---")
+    for name, (connect_times, response_times) in results.items():
+        print(f"{name:<7} ok={len(connect_times):<5} "
+              f"connect p50={percentile(connect_times, 0.5):7.1f} p99={percentile(connect_times, 0.99):7.1f} max={percentile(connect_times, 1):7.1f}   "
+              f"first byte p50={percentile(response_times, 0.5):7.1f} p99={percentile(response_times, 0.99):7.1f}")
@@ -0,0 +1,73 @@
+import threading
+import time
+from load_balancer import LoadBalancer, LBOpts
+from strategies.least_connections_strategy import LeastConnectionsStrategy
+from test.benchmarks.bench_helper import LB_IP, LB_PORT, start_backends, stop_processes
+
+# Accept path contention: acceptor threads run server selection + release back to back, as every accepted connection does.
+# Run from the load_balancer directory:
+#   sudo python3 -m test.benchmarks.bench_contention
+# "global lock" wraps the same path in one mutex shared with release, the way every accept used to be serialized.
+
+DURATION = 3
+ACCEPTORS = [1, 8, 32]
+
+
+class GlobalLockLoadBalancer(LoadBalancer):
+    """ Selection and release serialized behind a single LB-wide lock, as before the lock-free accept path. """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.server_lock = threading.Lock()
+
+    def select_server(self, *args, **kwargs):
+        with self.server_lock:
+            return super().select_server(*args, **kwargs)
+
+    def release_server(self, *args, **kwargs):
+        with self.server_lock:
+            super().release_server(*args, **kwargs)
+
+
+def acceptor(lb: LoadBalancer, end_time: float, counts: list, index: int):
+    client_addr = (f"10.0.{index // 256}.{index % 256}", 40000)
+    done = 0
+    while time.time() < end_time:
+        server, _ = lb.select_server(client_addr)
+        lb.release_server(server)
+        done += 1
+    counts[index] = done
+
+
+def measure_accept_rate(lb: LoadBalancer, acceptors: int) -> float:
+    counts = [0] * acceptors
+    end_time = time.time() + DURATION
+    threads = [threading.Thread(target=acceptor, args=(lb, end_time, counts, i)) for i in range(acceptors)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / DURATION
+
+
+def bench_contention():
+    backends, servers = start_backends()
+    results = {}
+    try:
+        opts = LBOpts(sticky_sessions=True, health_check_interval=3600)
+        for port, (name, lb_class) in enumerate([("global lock", GlobalLockLoadBalancer), ("lock-free", LoadBalancer)], LB_PORT):
+            lb = lb_class(LB_IP, port, servers, LeastConnectionsStrategy(servers), opts)
+            time.sleep(0.5)  # let the first health check round finish
+            results[name] = {n: measure_accept_rate(lb, n) for n in ACCEPTORS}
+            lb.lb_socket.close()
+    finally:
+        stop_processes(backends)
+    return results
+
+
+if __name__ == "__main__":
+    results = bench_contention()
+
+    print(f"\n--- Accept Path Contention ({DURATION}s each, sticky sessions + least connections) ---")
+    for name, rates in results.items():
+        print(f"{name:<12} " + "   ".join(f"{n:>2} acceptors {rate:10.0f}/s" for n, rate in rates.items()))
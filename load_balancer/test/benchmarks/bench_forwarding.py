@@ -0,0 +1,102 @@
+import os
+import select
+import socket
+import time
+from forwarding import Forwarder, SPLICE_AVAILABLE
+from test.benchmarks.bench_helper import start_process, stop_processes
+
+# Bulk transfer throughput and CPU cost of the forwarding loop, isolated from HTTP and server selection.
+#   python3 -m test.benchmarks.bench_forwarding
+# A sender process streams TOTAL_MB into the forwarder, which pumps it to a receiver process the same way
+# LoadBalancer.forward_loop does. Only the forwarder's (this process's) CPU time is counted.
+
+TOTAL_MB = 512
+BUF_SIZE = 4096
+CHUNK = 1 << 16
+
+
+def sender(port: int, total_bytes: int):
+    payload = b"x" * CHUNK
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sent = 0
+        while sent < total_bytes:
+            sock.sendall(payload)
+            sent += len(payload)
+
+
+def receiver(port: int):
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        buf = bytearray(CHUNK)
+        while sock.recv_into(buf):
+            pass
+
+
+def legacy_forward(src: socket.socket, dst: socket.socket):
+    """ The original handle_connection loop body: a fresh bytes object per recv. """
+    data = src.recv(BUF_SIZE)
+    if data:
+        dst.sendall(data)
+    return len(data)
+
+
+def accept_pair():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(2)
+    return listener, listener.getsockname()[1]
+
+
+def run_transfer(forward) -> tuple:
+    """ Returns (MB/s, CPU seconds per GB) of the forwarding side. """
+    total_bytes = TOTAL_MB * 1024 * 1024
+    in_listener, in_port = accept_pair()
+    out_listener, out_port = accept_pair()
+
+    procs = [start_process(receiver, out_port)]
+    dst, _ = out_listener.accept()
+    procs.append(start_process(sender, in_port, total_bytes))
+    src, _ = in_listener.accept()
+    for sock in (src, dst):
+        sock.settimeout(5)
+
+    cpu_start = os.times()
+    start = time.perf_counter()
+    moved = 0
+    while True:
+        select.select([src], [], [])
+        n = forward(src, dst)
+        if n is None:
+            continue
+        if not n:
+            break
+        moved += n
+    elapsed = time.perf_counter() - start
+    cpu_end = os.times()
+
+    dst.close()
+    src.close()
+    in_listener.close()
+    out_listener.close()
+    stop_processes(procs)
+
+    cpu = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+    gb = moved / (1024 ** 3)
+    return moved / (1024 * 1024) / elapsed, cpu / gb
+
+
+if __name__ == "__main__":
+    modes = [("recv + sendall (original)", legacy_forward)]
+
+    copy_forwarder = Forwarder("copy", BUF_SIZE)
+    modes.append(("recv_into reusable buffer", copy_forwarder.forward))
+
+    if SPLICE_AVAILABLE:
+        splice_forwarder = Forwarder("splice", BUF_SIZE)
+        modes.append(("splice through pipe", splice_forwarder.forward))
+    else:
+        print("os.splice is unavailable on this platform, skipping splice mode")
+
+    print(f"\n--- Forwarding {TOTAL_MB} MB over loopback ---")
+    for name, forward in modes:
+        mbps, cpu_per_gb = run_transfer(forward)
+        print(f"{name:<28} {mbps:9.1f} MB/s   {cpu_per_gb:6.2f} CPU s/GB")
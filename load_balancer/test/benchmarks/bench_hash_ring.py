@@ -0,0 +1,87 @@
+import bisect
+import hashlib
+import random
+import sys
+import time
+from serv_obj import Server
+from strategies.consistent_hash_strategy import ConsistentHashing
+
+# Consistent hash ring build and lookup cost. Run from the load_balancer directory:
+#   python3 -m test.benchmarks.bench_hash_ring [num_servers] [replicas]
+# "md5 ring" is the previous implementation: MD5 hex digests parsed as ints, insort per replica, lookups walking the
+# ring past unavailable replicas.
+
+NUM_SERVERS = 1000
+REPLICAS = 100
+LOOKUPS = 100000
+HOT_CLIENTS = 1000  # distinct source IPs behind the cached lookups
+UNHEALTHY_FRACTION = 0.3
+
+
+class MD5Ring(ConsistentHashing):
+    """ The ring as it was before: MD5, insort and a linear walk past unavailable replicas. """
+
+    def __init__(self, servers, replica_count=100):
+        self.servers = servers
+        self.healthy_servers = tuple(servers)
+        self.replica_count = replica_count
+        self.hash_ring = dict()
+        self.sorted_hash = []
+        for server in self.servers:
+            for i in range(self.replica_count):
+                replica_hash = self._hash(f"{server.ip}replica{i}")
+                self.hash_ring[replica_hash] = server
+                bisect.insort(self.sorted_hash, replica_hash)
+
+    def update_healthy(self, healthy_servers):
+        self.healthy_servers = healthy_servers
+
+    def get_server(self, **kwargs):
+        source_hash = self._hash(kwargs.get("source_ip"))
+        closest_server = bisect.bisect_left(self.sorted_hash, source_hash)
+        if closest_server == len(self.sorted_hash):
+            closest_server = 0
+        for i in range(len(self.sorted_hash)):
+            server = self.hash_ring[self.sorted_hash[(closest_server + i) % len(self.sorted_hash)]]
+            if server.is_available():
+                return server
+        return None
+
+    def _hash(self, key):
+        return abs(int(hashlib.md5(bytes(key, "UTF-8")).hexdigest(), 16))
+
+
+def bench_ring(cls, num_servers: int, replicas: int):
+    servers = [Server(f"s{i}", f"10.{i // 65536}.{i // 256 % 256}.{i % 256}", 80) for i in range(num_servers)]
+    start = time.perf_counter()
+    ring = cls(servers, replicas)
+    build = time.perf_counter() - start
+
+    rng = random.Random(1)
+    for server in rng.sample(servers, int(num_servers * UNHEALTHY_FRACTION)):
+        server.set_healthy(False)
+    start = time.perf_counter()
+    ring.update_healthy(tuple(s for s in servers if s.is_available()))
+    health_update = time.perf_counter() - start
+
+    cold_ips = [f"172.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}" for _ in range(LOOKUPS)]
+    hot_ips = [f"192.168.{i // 256}.{i % 256}" for i in range(HOT_CLIENTS)]
+    hot_ips = [rng.choice(hot_ips) for _ in range(LOOKUPS)]
+    results = {"build": build, "health update": health_update}
+    for name, ips in (("cold lookup", cold_ips), ("hot lookup", hot_ips)):
+        start = time.perf_counter()
+        for ip in ips:
+            ring.get_server(source_ip=ip)
+        results[name] = (time.perf_counter() - start) / len(ips)
+    return results
+
+
+if __name__ == "__main__":
+    num_servers = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_SERVERS
+    replicas = int(sys.argv[2]) if len(sys.argv) > 2 else REPLICAS
+
+    print(f"\n--- Hash Ring ({num_servers} servers x {replicas} replicas, {UNHEALTHY_FRACTION:.0%} unhealthy) ---")
+    for name, cls in (("md5 ring", MD5Ring), ("array ring", ConsistentHashing)):
+        r = bench_ring(cls, num_servers, replicas)
+        print(f"{name:<12} build {r['build'] * 1000:8.1f}ms   health update {r['health update'] * 1000:7.1f}ms   "
+              f"cold lookup {r['cold lookup'] * 1e6:6.2f}us   hot lookup {r['hot lookup'] * 1e6:6.2f}us")
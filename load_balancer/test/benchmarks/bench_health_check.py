@@ -0,0 +1,88 @@
+import asyncio
+import statistics
+import sys
+import time
+from health_check import HealthCheckService
+from serv_obj import Server
+from test.benchmarks.bench_helper import BACKEND_IPS, start_process, stop_processes, wait_for_port
+
+# Health check scheduling at scale: how closely thousands of backends keep to a 1 s check period. Run from the
+# load_balancer directory:
+#   python3 -m test.benchmarks.bench_health_check [num_servers]
+# Live servers all point at a few tiny asyncio backends, dead ones at a port nobody listens on.
+
+NUM_SERVERS = 5000
+DEAD_FRACTION = 0.2
+INTERVAL = 1.0
+DURATION = 15
+HEALTH_PORT = 9080
+DEAD_PORT = 9081
+
+
+def run_health_backend(ip: str, port: int):
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\nConnection: close\r\n\r\nOK\n")
+        await writer.drain()
+        writer.close()
+
+    async def serve():
+        server = await asyncio.start_server(handle, ip, port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+class RecordingHealthCheckService(HealthCheckService):
+    """ Records when every server was probed. """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.probe_times = {server.name: [] for server in self.servers}
+
+    async def check_server(self, server: Server):
+        self.probe_times[server.name].append(time.monotonic())
+        await super().check_server(server)
+
+
+def bench_health_check(num_servers: int):
+    backends = [start_process(run_health_backend, ip, HEALTH_PORT) for ip in BACKEND_IPS]
+    for ip in BACKEND_IPS:
+        wait_for_port(ip, HEALTH_PORT)
+
+    servers = []
+    for i in range(num_servers):
+        ip = BACKEND_IPS[i % len(BACKEND_IPS)]
+        port = DEAD_PORT if i < num_servers * DEAD_FRACTION else HEALTH_PORT
+        servers.append(Server(f"s{i}", ip, port))
+
+    service = RecordingHealthCheckService(servers, INTERVAL, "/health", timeout=1, max_concurrency=512)
+    try:
+        start = time.monotonic()
+        service.start()
+        time.sleep(DURATION)
+        # Only count periods that ended in the window - the first probe lands anywhere in the first interval
+        periods = []
+        for times in service.probe_times.values():
+            periods.extend(b - a for a, b in zip(times, times[1:]))
+        probes = sum(len(times) for times in service.probe_times.values())
+        healthy = sum(server.is_healthy() for server in servers)
+    finally:
+        stop_processes(backends)
+    return {
+        "probes/s": probes / (time.monotonic() - start),
+        "period mean": statistics.mean(periods),
+        "period p99": sorted(periods)[int(len(periods) * 0.99)],
+        "period max": max(periods),
+        "healthy": healthy,
+    }
+
+
+if __name__ == "__main__":
+    num_servers = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_SERVERS
+    results = bench_health_check(num_servers)
+
+    print(f"\n--- Health Check Scheduling ({num_servers} servers, {DEAD_FRACTION:.0%} dead, {INTERVAL}s interval, {DURATION}s) ---")
+    print(f"probes/s {results['probes/s']:.0f} (target {num_servers / INTERVAL:.0f})   healthy {results['healthy']}/{num_servers}")
+    print(f"check period mean {results['period mean']:.3f}s  p99 {results['period p99']:.3f}s  max {results['period max']:.3f}s")
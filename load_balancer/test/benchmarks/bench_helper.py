@@ -0,0 +1,112 @@
+import http.server
+import multiprocessing
+import socket
+import socketserver
+import time
+import typing
+from serv_obj import Server
+
+# Loopback benchmarks - unlike test/tests these run without mininet, backends listen on 127.0.0.x
+LB_IP = "127.0.0.1"
+LB_PORT = 8080
+BACKEND_IPS = ["127.0.0.2", "127.0.0.3", "127.0.0.4"]
+BACKEND_PORT = 80
+
+context = multiprocessing.get_context("fork")
+
+
+def run_backend(ip: str, port: int, body_size: int):
+    """ Minimal HTTP backend that answers every GET with body_size bytes. """
+    body = b"x" * body_size
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            payload = b"OK\n" if self.path == "/health" else body
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    class Backend(socketserver.ThreadingTCPServer):
+        allow_reuse_address = True
+        daemon_threads = True
+        request_queue_size = 1024
+
+    with Backend((ip, port), Handler) as httpd:
+        httpd.serve_forever()
+
+
+def start_backends(num_servers=len(BACKEND_IPS), body_size=64) -> typing.Tuple[typing.List[multiprocessing.Process], typing.List[Server]]:
+    processes = []
+    servers = []
+    for i, ip in enumerate(BACKEND_IPS[:num_servers]):
+        p = context.Process(target=run_backend, args=(ip, BACKEND_PORT, body_size), daemon=True)
+        p.start()
+        processes.append(p)
+        servers.append(Server(f"s{i + 1}", ip, BACKEND_PORT))
+    wait_for_port(BACKEND_IPS[0], BACKEND_PORT)
+    return processes, servers
+
+
+def start_process(target: typing.Callable, *args) -> multiprocessing.Process:
+    # Not daemonic so that the process may fork workers of its own, callers stop it with stop_processes
+    p = context.Process(target=target, args=args)
+    p.start()
+    return p
+
+
+def stop_processes(processes: typing.List[multiprocessing.Process]):
+    for p in processes:
+        p.terminate()
+    for p in processes:
+        p.join()
+
+
+def wait_for_port(ip: str, port: int, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((ip, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{ip}:{port} did not come up")
+
+
+def http_get(ip: str, port: int, path="/") -> bytes:
+    """ Send one HTTP/1.0 GET and read the response until the server closes. """
+    with socket.create_connection((ip, port), timeout=10) as sock:
+        sock.sendall(f"GET {path} HTTP/1.0\r\nHost: {ip}\r\n\r\n".encode())
+        chunks = []
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+    return b"".join(chunks)
+
+
+def _client_loop(ip: str, port: int, end_time: float, counter):
+    done = 0
+    while time.time() < end_time:
+        try:
+            if b" 200 " in http_get(ip, port):
+                done += 1
+        except OSError:
+            pass
+    with counter.get_lock():
+        counter.value += done
+
+
+def measure_throughput(ip: str, port: int, duration=5.0, clients=8) -> float:
+    """ Run closed-loop client processes against ip:port and return successful requests per second. """
+    counter = context.Value("l", 0)
+    end_time = time.time() + duration
+    procs = [start_process(_client_loop, ip, port, end_time, counter) for _ in range(clients)]
+    for p in procs:
+        p.join()
+    return counter.value / duration
@@ -0,0 +1,63 @@
+import collections
+import random
+import sys
+import time
+from serv_obj import Server
+from strategies.consistent_hash_strategy import ConsistentHashing
+from strategies.maglev_strategy import MaglevHashing
+
+# Maglev vs the consistent hash ring. Run from the load_balancer directory:
+#   python3 -m test.benchmarks.bench_maglev [num_servers ...]
+# balance is the busiest server's share of KEYS over the mean share (1.0 is perfect); remap is the fraction of keys that
+# move when one server fails, where the ideal is the failed server's own 1 / num_servers.
+
+SERVER_COUNTS = [10, 100, 1000]
+KEYS = 100000
+
+
+def make_strategy(name: str, servers):
+    if name == "maglev":
+        return MaglevHashing(servers)
+    return ConsistentHashing(servers, 100)
+
+
+def wait_for_rebuild(strategy, rebuilds: int):
+    while isinstance(strategy, MaglevHashing) and strategy.rebuilds < rebuilds:
+        time.sleep(0.01)
+
+
+def bench(name: str, num_servers: int):
+    servers = [Server(f"s{i}", f"10.{i // 65536}.{i // 256 % 256}.{i % 256}", 80) for i in range(num_servers)]
+    start = time.perf_counter()
+    strategy = make_strategy(name, servers)
+    build = time.perf_counter() - start
+
+    rng = random.Random(1)
+    keys = [f"172.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}" for _ in range(KEYS)]
+    start = time.perf_counter()
+    before = [strategy.get_server(source_ip=key) for key in keys]
+    lookup = (time.perf_counter() - start) / KEYS
+
+    loads = collections.Counter(before)
+    balance = max(loads.values()) / (KEYS / num_servers)
+
+    servers[0].set_healthy(False)
+    start = time.perf_counter()
+    strategy.update_healthy(tuple(s for s in servers if s.is_available()))
+    wait_for_rebuild(strategy, 1)
+    rebuild = time.perf_counter() - start
+    after = [strategy.get_server(source_ip=key) for key in keys]
+    remap = sum(a is not b for a, b in zip(before, after)) / KEYS
+    return {"build": build, "rebuild": rebuild, "lookups/s": 1 / lookup, "balance": balance, "remap": remap}
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or SERVER_COUNTS
+
+    print(f"\n--- Maglev vs Hash Ring ({KEYS} source IPs, one server failed for remap) ---")
+    for num_servers in counts:
+        for name in ("hash", "maglev"):
+            r = bench(name, num_servers)
+            print(f"{num_servers:>6} servers {name:<7} build {r['build'] * 1000:7.1f}ms  rebuild {r['rebuild'] * 1000:7.1f}ms  "
+                  f"{r['lookups/s'] / 1000:6.0f}k lookups/s  balance {r['balance']:.3f}  "
+                  f"remap {r['remap']:.2%} (ideal {1 / num_servers:.2%})")
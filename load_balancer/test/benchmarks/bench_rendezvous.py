@@ -0,0 +1,65 @@
+import collections
+import random
+import sys
+import time
+from serv_obj import Server
+import strategies.rendezvous_hash_strategy as rendezvous
+from strategies.rendezvous_hash_strategy import RendezvousHashing
+from strategies.consistent_hash_strategy import hash64
+
+# Rendezvous hashing lookup cost at hundreds of backends. Run from the load_balancer directory:
+#   python3 -m test.benchmarks.bench_rendezvous [num_servers]
+# "cached" replays Zipf distributed keys through get_server (LRU in front), "cold" scores every lookup, "bulk" scores
+# a batch of keys as one matrix and "python" is the fallback used without NumPy.
+
+NUM_SERVERS = 500
+KEYS = 20000
+CLIENTS = 2000
+ZIPF_S = 1.1
+
+
+def per_lookup(fn, keys) -> float:
+    start = time.perf_counter()
+    fn(keys)
+    return (time.perf_counter() - start) / len(keys)
+
+
+def bench_rendezvous(num_servers: int):
+    servers = [Server(f"s{i}", f"10.0.{i // 256}.{i % 256}", 80) for i in range(num_servers)]
+    strategy = RendezvousHashing(servers)
+    rng = random.Random(1)
+    ips = [f"172.16.{i // 256}.{i % 256}" for i in range(CLIENTS)]
+    hot_keys = rng.choices(ips, [1 / rank ** ZIPF_S for rank in range(1, CLIENTS + 1)], k=KEYS)
+    cold_keys = [f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}" for _ in range(KEYS)]
+
+    results = {
+        "cached": per_lookup(lambda keys: [strategy.get_server(source_ip=key) for key in keys], hot_keys),
+        "cold": per_lookup(lambda keys: [strategy._best(strategy.view, hash64(key)) for key in keys], cold_keys),
+        "bulk": per_lookup(strategy.get_servers, cold_keys),
+    }
+    numpy_available = rendezvous.NUMPY_AVAILABLE
+    rendezvous.NUMPY_AVAILABLE = False
+    try:
+        results["python"] = per_lookup(lambda keys: [strategy._best(strategy.view, hash64(key)) for key in keys], cold_keys[:1000])
+    finally:
+        rendezvous.NUMPY_AVAILABLE = numpy_available
+
+    before = strategy.get_servers(cold_keys)
+    loads = collections.Counter(before)
+    results["balance"] = max(loads.values()) / (KEYS / num_servers)
+    servers[0].set_healthy(False)
+    strategy.update_healthy(tuple(s for s in servers if s.is_available()))
+    after = strategy.get_servers(cold_keys)
+    results["remap"] = sum(a is not b for a, b in zip(before, after)) / KEYS
+    results["owned"] = loads[servers[0]] / KEYS
+    return results
+
+
+if __name__ == "__main__":
+    num_servers = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_SERVERS
+    r = bench_rendezvous(num_servers)
+
+    print(f"\n--- Rendezvous Hashing ({num_servers} servers, NumPy {'on' if rendezvous.NUMPY_AVAILABLE else 'off'}) ---")
+    print(f"cached {r['cached'] * 1e6:.2f}us   cold {r['cold'] * 1e6:.2f}us   bulk {r['bulk'] * 1e6:.2f}us   "
+          f"python {r['python'] * 1e6:.2f}us per lookup")
+    print(f"balance (max/mean keys) {r['balance']:.2f}   remap on one failure {r['remap']:.2%} (its own keys {r['owned']:.2%})")
@@ -0,0 +1,78 @@
+import random
+import sys
+import time
+from health_check import HealthCheckInfo
+from serv_obj import Server
+from strategies.round_robin_strategy import RoundRobinStrategy
+from strategies.weighted_round_robin_strategy import WeightedRoundRobinStrategy
+from strategies.least_connections_strategy import LeastConnectionsStrategy
+from strategies.indexed_least_connections_strategy import IndexedLeastConnectionsStrategy
+from strategies.least_response_time_strategy import LeastResponseTimeStrategy
+from strategies.power_of_two_choices_strategy import PowerOfTwoChoicesStrategy
+
+# Strategy selection microbenchmark, no sockets involved. Run from the load_balancer directory:
+#   python3 -m test.benchmarks.bench_strategies [num_servers ...]
+# "us/select" is the cost of one get_server call. "herd" is how many of BATCH selections made against the same (stale)
+# connection counts and latencies land on the busiest server - what happens between updates when many connections
+# arrive at once. Lower is better, BATCH / num_servers is ideal.
+
+SERVER_COUNTS = [10, 100, 1000, 10000]
+SELECTIONS = 20000
+BATCH = 64
+
+STRATEGIES = {
+    "round_robin": RoundRobinStrategy,
+    "weighted_round_robin": WeightedRoundRobinStrategy,
+    "least_connections": LeastConnectionsStrategy,
+    "least_connections_indexed": IndexedLeastConnectionsStrategy,
+    "least_response_time": LeastResponseTimeStrategy,
+    "power_of_two_choices": PowerOfTwoChoicesStrategy,
+}
+
+
+def make_servers(num_servers: int):
+    rng = random.Random(1)
+    servers = []
+    for i in range(num_servers):
+        server = Server(f"s{i}", f"10.{i // 65536}.{i // 256 % 256}.{i % 256}", 80)
+        server.active_connections.set(rng.randrange(20))
+        info = HealthCheckInfo()
+        info.avg_rtt = rng.uniform(0.001, 0.010)
+        server.set_additional_info("health_check_info", info)
+        servers.append(server)
+    return servers
+
+
+def bench_strategy(cls, num_servers: int):
+    servers = make_servers(num_servers)
+    strategy = cls(servers)
+    for server in servers:
+        strategy.record_latency(server, server.get_additional_info("health_check_info").avg_rtt)
+
+    selections = max(1000, SELECTIONS // max(1, num_servers // 100))
+    start = time.perf_counter()
+    for _ in range(selections):
+        strategy.get_server()
+    per_select = (time.perf_counter() - start) / selections
+
+    herd = 0
+    for _ in range(20):
+        picks = {}
+        for _ in range(BATCH):
+            server = strategy.get_server()
+            picks[server] = picks.get(server, 0) + 1
+        herd = max(herd, max(picks.values()))
+    return per_select, herd
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or SERVER_COUNTS
+
+    print(f"\n--- Strategy Selection (us/select, herd = max of {BATCH} stale selections on one server) ---")
+    print(f"{'strategy':<26}" + "".join(f"{n:>20}" for n in counts))
+    for name, cls in STRATEGIES.items():
+        row = []
+        for num_servers in counts:
+            per_select, herd = bench_strategy(cls, num_servers)
+            row.append(f"{per_select * 1e6:9.2f}us herd {herd:>3}")
+        print(f"{name:<26}" + "".join(f"{cell:>20}" for cell in row))
@@ -0,0 +1,46 @@
+import os
+from load_balancer import LoadBalancer, LBOpts
+from strategies.round_robin_strategy import RoundRobinStrategy
+from workers import WorkerPool
+from test.benchmarks.bench_helper import LB_IP, LB_PORT, start_backends, start_process, stop_processes, wait_for_port, measure_throughput
+
+# Loopback throughput of the LB against worker count. Run from the load_balancer directory:
+#   sudo python3 -m test.benchmarks.bench_workers
+# Scaling is bounded by the number of cores - the clients and backends share the same machine.
+
+DURATION = 5
+CLIENTS = 16
+
+
+def run_lb(servers, workers):
+    opts = LBOpts(health_check_interval=1, workers=workers, cpu_affinity=True)
+    if workers > 1:
+        WorkerPool(LB_IP, LB_PORT, servers, RoundRobinStrategy, opts).start()
+    else:
+        LoadBalancer(LB_IP, LB_PORT, servers, RoundRobinStrategy(servers), opts).start_lb()
+
+
+def bench_workers(worker_counts):
+    backends, servers = start_backends()
+    results = {}
+    try:
+        for workers in worker_counts:
+            lb = start_process(run_lb, servers, workers)
+            try:
+                wait_for_port(LB_IP, LB_PORT)
+                results[workers] = measure_throughput(LB_IP, LB_PORT, DURATION, CLIENTS)
+            finally:
+                stop_processes([lb])
+    finally:
+        stop_processes(backends)
+    return results
+
+
+if __name__ == "__main__":
+    cpus = len(os.sched_getaffinity(0))
+    counts = sorted({1, 2, 4, cpus})
+    results = bench_workers(counts)
+
+    print(f"\n--- Worker Scaling ({cpus} CPUs, {CLIENTS} clients, {DURATION}s each) ---")
+    for workers, rps in results.items():
+        print(f"workers={workers:<3} {rps:10.1f} req/s   speedup x{rps / results[1]:.2f}")
@@ -0,0 +1,79 @@
+from serv_obj import Server
+from load_balancer import LoadBalancer, LBOpts
+from lb_logger import LogOpts
+from admin import AdminServer, AdminOpts
+from config import LBConfig, ConfigError
+from strategies.least_connections_strategy import LeastConnectionsStrategy
+from strategies.indexed_least_connections_strategy import IndexedLeastConnectionsStrategy
+
+# Admin API checks, no mininet needed. Run from the load_balancer directory:
+#   python3 -m test.tests.test_admin_api
+# Drives AdminServer.respond against a load balancer bound to a free loopback port. Invalid changes must be rejected
+# with a 4xx before anything is written, and selection must keep working after them. Config files (startup and reload)
+# must reject the same weights, and unknown or out-of-range option values.
+
+STRATEGIES = (LeastConnectionsStrategy, IndexedLeastConnectionsStrategy)
+
+
+def make_admin(strategy_class):
+    servers = [Server(f"s{i}", f"127.0.0.{i + 2}", 80) for i in range(3)]
+    opts = LBOpts(log_opts=LogOpts(path=None, echo=False))
+    lb = LoadBalancer("127.0.0.1", 0, servers, strategy_class(servers), opts)
+    return lb, AdminServer(lb, AdminOpts(port=0))
+
+
+def check_rejects_zero_weight(strategy_class):
+    lb, admin = make_admin(strategy_class)
+    for weight in (0, -1, "x", 2.7, 1.5, True):
+        status, _ = admin.respond("PUT", "/servers/s1/weight", {"weight": weight})
+        assert status == 400, f"{strategy_class.__name__}: weight {weight!r} got {status}"
+        assert "weight" not in lb.find_server("s1").additional_info, f"{strategy_class.__name__}: weight {weight!r} was written"
+        status, _ = admin.respond("POST", "/servers", {"name": "s9", "ip": "127.0.0.9", "port": 80, "weight": weight})
+        assert status == 400 and not any(s.name == "s9" for s in lb.servers), f"{strategy_class.__name__}: added s9 with weight {weight!r}"
+
+    status, _ = admin.respond("PUT", "/servers/s1/weight", {"weight": 3})
+    assert status == 200 and lb.find_server("s1").additional_info["weight"] == 3
+    for _ in range(10):
+        server, error = lb.select_server(("10.0.0.1", 1234))
+        assert server is not None, f"{strategy_class.__name__}: no server selected: {error}"
+        lb.release_server(server)
+    admin.httpd.server_close()
+    lb.lb_socket.close()
+
+
+def test_rejects_zero_weight():
+    for strategy_class in STRATEGIES:
+        check_rejects_zero_weight(strategy_class)
+
+
+def test_config_rejects_zero_weight():
+    for weight in (0, -1, "x", 2.7, True):
+        config = {"load_balancer_ip": "127.0.0.1", "load_balancer_port": 8000,
+                  "servers": [{"name": "s1", "ip": "127.0.0.2", "port": 80, "weight": weight}]}
+        try:
+            LBConfig(config)
+        except ConfigError:
+            continue
+        raise AssertionError(f"config with weight {weight!r} passed validation")
+
+
+def test_config_rejects_invalid_values():
+    base = {"load_balancer_ip": "127.0.0.1", "load_balancer_port": 8000,
+            "servers": [{"name": "s1", "ip": "127.0.0.2", "port": 80}]}
+    LBConfig(dict(base, hash_key="cookie:session", forwarding_mode="splice", workers=2, logging={"level": "info"}))
+    for invalid in ({"logging": {"level": "verbose"}}, {"forwarding_mode": "splice "}, {"hash_key": "ip"},
+                    {"workers": 0}, {"workers": "2"}, {"listen_backlog": 0},
+                    {"data_plane": "asyncio", "forwarding_mode": "splice"}, {"data_plane": "asyncio", "proxy_mode": "l7"}):
+        try:
+            LBConfig(dict(base, **invalid))
+        except ConfigError as e:
+            assert "Missing config key" not in str(e), f"{invalid}: {e}"
+            continue
+        raise AssertionError(f"config with {invalid} passed validation")
+
+
+if __name__ == "__main__":
+    test_rejects_zero_weight()
+    test_config_rejects_zero_weight()
+    test_config_rejects_invalid_values()
+    print(f"Admin API and config validation rejected invalid weights and options ({', '.join(s.__name__ for s in STRATEGIES)})")
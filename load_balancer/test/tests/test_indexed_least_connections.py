@@ -0,0 +1,54 @@
+import random
+from serv_obj import Server
+from strategies.least_connections_strategy import LeastConnectionsStrategy
+from strategies.indexed_least_connections_strategy import IndexedLeastConnectionsStrategy
+
+# Property test, no mininet needed. Run from the load_balancer directory:
+#   python3 -m test.tests.test_indexed_least_connections
+# Random sequences of connection count changes, health changes and retries with exclude hints are applied to both
+# strategies, which must pick the same server after every step.
+
+RUNS = 200
+STEPS = 500
+
+
+def test_indexed_least_connections(runs=RUNS, steps=STEPS):
+    for seed in range(runs):
+        rng = random.Random(seed)
+        servers = [Server(f"s{i}", f"10.0.0.{i}", 80) for i in range(rng.randint(1, 12))]
+        for server in servers:
+            if rng.random() < 0.5:
+                server.set_additional_info("weight", rng.randint(1, 4))
+            server.set_healthy(rng.random() < 0.8)
+
+        scan = LeastConnectionsStrategy(servers)
+        indexed = IndexedLeastConnectionsStrategy(servers)
+
+        for step in range(steps):
+            op = rng.random()
+            server = rng.choice(servers)
+            exclude = None
+            if op < 0.45:
+                server.add_active_connections(1)
+                indexed.connection_count_changed(server)
+            elif op < 0.8:
+                if server.get_active_connections() > 0:
+                    server.add_active_connections(-1)
+                    indexed.connection_count_changed(server)
+            elif op < 0.9:
+                server.set_healthy(not server.is_healthy())
+                healthy = tuple(s for s in servers if s.is_available())
+                scan.update_healthy(healthy)
+                indexed.update_healthy(healthy)
+            else:
+                exclude = set(rng.sample(servers, rng.randint(1, len(servers))))
+
+            expected = scan.get_server(exclude=exclude)
+            actual = indexed.get_server(exclude=exclude)
+            assert actual is expected, (
+                f"seed {seed} step {step}: scan picked {expected and expected.name}, heap picked {actual and actual.name}")
+
+
+if __name__ == "__main__":
+    test_indexed_least_connections()
+    print(f"Indexed least connections matched the scan over {RUNS} runs of {STEPS} steps")
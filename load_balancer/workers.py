@@ -0,0 +1,77 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+import typing
+from serv_obj import Server
+from shared_state import SharedBackendState
+from health_check import HealthCheckService
+from load_balancer import LoadBalancer, LBOpts
+
+
+class WorkerPool:
+    """
+    Pre-fork supervisor. Runs the health checks once and forks opts.workers load balancer processes that all bind the same
+    port with SO_REUSEPORT. Connection counts, health and sticky sessions live in a SharedBackendState so that strategies
+    and load shedding in every worker see global state.
+    """
+
+    def __init__(self, ip, port, servers: typing.List[Server], strategy_factory: typing.Callable, opts: LBOpts = LBOpts(), lb_class=LoadBalancer):
+        self.ip = ip
+        self.port = port
+        self.servers = servers
+        self.strategy_factory = strategy_factory
+        self.opts = opts
+        self.lb_class = lb_class
+
+        self.shared_state = SharedBackendState(len(servers), opts.sticky_max_sessions, opts.sticky_timeout)
+        self.shared_state.attach(servers)
+
+        self.context = multiprocessing.get_context("fork")
+        self.processes: typing.Dict[int, multiprocessing.Process] = {}
+
+    def start(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # Health results are written straight into shared memory so every worker observes them
+        health_check_service = HealthCheckService.from_lb_opts(self.servers, self.opts, self.shared_state)
+        health_check_service.start()
+
+        for worker_id in range(self.opts.workers):
+            self.spawn(worker_id)
+
+        # Replace any worker that dies so the port keeps its full set of listeners
+        while True:
+            multiprocessing.connection.wait([p.sentinel for p in self.processes.values()])
+            for worker_id, process in list(self.processes.items()):
+                if not process.is_alive():
+                    print(f"[LB] Worker {worker_id} exited with code {process.exitcode}, restarting")
+                    self.spawn(worker_id)
+
+    def spawn(self, worker_id: int):
+        process = self.context.Process(target=self.run_worker, args=(worker_id,), daemon=True)
+        process.start()
+        self.processes[worker_id] = process
+
+    def stop(self, signum=None, frame=None):
+        """ Terminate every worker along with the supervisor so no orphan keeps the port bound. """
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            process.join()
+        sys.exit(0)
+
+    def run_worker(self, worker_id: int):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+        if self.opts.cpu_affinity:
+            cpus = sorted(os.sched_getaffinity(0))
+            os.sched_setaffinity(0, {cpus[worker_id % len(cpus)]})
+
+        # Each worker keeps its own strategy instance (e.g. round robin position), the state it reads is shared
+        lb = self.lb_class(self.ip, self.port, self.servers, self.strategy_factory(self.servers), self.opts, shared_state=self.shared_state)
+        lb.print_debug("Worker %s (pid %s) started", worker_id, os.getpid())
+        lb.start_lb()